@@ -2,18 +2,33 @@ import os
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.security import generate_password_hash, check_password_hash
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-from torchvision.models import resnet50, resnet18
-import torchvision.transforms as T
 from PIL import Image
 import io
+import math
 import base64
+import binascii
 import numpy as np
 from datetime import datetime, timedelta
 import jwt
+import atexit
+import threading
+import time
+
+from auth_log_writer import AuthLogWriter
+from capture_sessions import CaptureSessionError, CaptureSessions
+from decode_pool import DecodePool
+from hash_cache import HashCache, array_pair_digest
+from image_admission import ImageAdmission, RequestRejectedError
+from quality_gate import QualityGate, ridge_patch
+from gallery_index import GalleryIndex, bytes_to_hash, bytes_to_words, create_index, hash_to_bytes, pack_hash
+from inference_scheduler import InferenceScheduler, SchedulerBusyError
+from inference_backends import load_backend, resolve_backend
+from thread_budget import apply as apply_thread_budget, compute_budget
+from preprocessing import BatchPreprocessor, face_array, fp_array, to_arrays
+from warmup import Warmup
 
 app = Flask(__name__)
 CORS(app, resources={r'/*': {'origins': '*', 'methods': ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'], 'allow_headers': ['Content-Type', 'Authorization']}})
@@ -21,22 +36,89 @@ CORS(app, resources={r'/*': {'origins': '*', 'methods': ['GET', 'POST', 'PUT', '
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///biometric_auth.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['GALLERY_INDEX_ENGINE'] = os.environ.get('GALLERY_INDEX_ENGINE', 'linear')
+app.config['GALLERY_MIH_TABLES'] = int(os.environ.get('GALLERY_MIH_TABLES', 8))
+# Full gallery reload interval, catching changes made to the user table outside the API.
+app.config['GALLERY_REFRESH_S'] = float(os.environ.get('GALLERY_REFRESH_S', 300))
+app.config['MAX_IDENTIFY_BATCH'] = int(os.environ.get('MAX_IDENTIFY_BATCH', 64))
+app.config['MAX_IDENTIFY_TOP_K'] = int(os.environ.get('MAX_IDENTIFY_TOP_K', 10))
+# Fingerprint-first identification; needs a bundle with a fingerprint code head (export_model.py --fp-hash-bits).
+app.config['CASCADE_IDENTIFICATION'] = os.environ.get('CASCADE_IDENTIFICATION', '0') == '1'
+app.config['CASCADE_SHORTLIST'] = int(os.environ.get('CASCADE_SHORTLIST', 32))
+app.config['CASCADE_FP_RADIUS'] = int(os.environ['CASCADE_FP_RADIUS']) if os.environ.get('CASCADE_FP_RADIUS') else None
+app.config['MODEL_WEIGHTS_PATH'] = os.environ.get('MODEL_WEIGHTS_PATH')
+app.config['MODEL_TORCHSCRIPT_PATH'] = os.environ.get('MODEL_TORCHSCRIPT_PATH')
+app.config['MODEL_ONNX_PATH'] = os.environ.get('MODEL_ONNX_PATH')
+app.config['MODEL_QUANTIZED_PATH'] = os.environ.get('MODEL_QUANTIZED_PATH')
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'auto')
+app.config['INFERENCE_FOLD_BN'] = os.environ.get('INFERENCE_FOLD_BN', '1') == '1'
+app.config['INFERENCE_PROFILE'] = os.environ.get('INFERENCE_PROFILE', 'default')
+app.config['INFERENCE_SOCKET'] = os.environ.get('INFERENCE_SOCKET', '/tmp/hashnet-inference.sock')
+app.config['ONNX_INTRA_OP_THREADS'] = int(os.environ.get('ONNX_INTRA_OP_THREADS', 0))
+app.config['INFERENCE_BATCHING'] = os.environ.get('INFERENCE_BATCHING', '1') == '1'
+app.config['INFERENCE_MAX_BATCH'] = int(os.environ.get('INFERENCE_MAX_BATCH', 8))
+app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5))
+app.config['INFERENCE_QUEUE_DEPTH'] = int(os.environ.get('INFERENCE_QUEUE_DEPTH', 256))
+app.config['INFERENCE_THREADS'] = int(os.environ.get('INFERENCE_THREADS', 0))
+app.config['INFERENCE_INTEROP_THREADS'] = int(os.environ.get('INFERENCE_INTEROP_THREADS', 0))
+# Exported by gunicorn.conf.py; a plain `python App.py` is one worker.
+app.config['WEB_WORKERS'] = int(os.environ.get('GUNICORN_WORKERS', 1))
+app.config['WEB_THREADS'] = int(os.environ.get('GUNICORN_THREADS', 1))
+# Decode JPEG uploads at reduced resolution (see preprocessing.load_image).
+app.config['JPEG_DRAFT_DECODE'] = os.environ.get('JPEG_DRAFT_DECODE', '1') == '1'
+# Upload limits, enforced from the request and image headers before decoding.
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.environ.get('MAX_UPLOAD_MB', 32)) * 1024 * 1024)
+app.config['IMAGE_MAX_BYTES'] = int(float(os.environ.get('IMAGE_MAX_MB', 10)) * 1024 * 1024)
+app.config['IMAGE_MAX_PIXELS'] = int(os.environ.get('IMAGE_MAX_PIXELS', 24_000_000))
+app.config['IMAGE_MIN_SIDE'] = int(os.environ.get('IMAGE_MIN_SIDE', 32))
+app.config['IMAGE_FORMATS'] = os.environ.get('IMAGE_FORMATS', 'JPEG,PNG,WEBP,BMP').split(',')
+# Reject unusable captures before inference (QUALITY_GATE_ENABLED=0 to hash everything).
+app.config['QUALITY_GATE_ENABLED'] = os.environ.get('QUALITY_GATE_ENABLED', '1') == '1'
+app.config['QUALITY_MIN_BRIGHTNESS'] = float(os.environ.get('QUALITY_MIN_BRIGHTNESS', 40))
+app.config['QUALITY_MAX_BRIGHTNESS'] = float(os.environ.get('QUALITY_MAX_BRIGHTNESS', 220))
+app.config['QUALITY_MIN_CONTRAST'] = float(os.environ.get('QUALITY_MIN_CONTRAST', 12))
+app.config['QUALITY_MIN_SHARPNESS'] = float(os.environ.get('QUALITY_MIN_SHARPNESS', 10))
+# Ridge check on fingerprints; 0 (off) until calibrated on real captures, see quality_gate.py.
+app.config['QUALITY_MIN_RIDGE_ENERGY'] = float(os.environ.get('QUALITY_MIN_RIDGE_ENERGY', 0))
+# Threads decoding a request's face and fingerprint concurrently (0 decodes on the request thread).
+app.config['DECODE_POOL_WORKERS'] = int(os.environ.get('DECODE_POOL_WORKERS', 4))
+# Cache hashes of repeated submissions; set HASH_CACHE_ENABLED=0 to always recompute.
+app.config['HASH_CACHE_ENABLED'] = os.environ.get('HASH_CACHE_ENABLED', '1') == '1'
+app.config['HASH_CACHE_SIZE'] = int(os.environ.get('HASH_CACHE_SIZE', 1024))
+app.config['HASH_CACHE_TTL_S'] = float(os.environ.get('HASH_CACHE_TTL_S', 300))
+# Two-phase capture: /api/capture/face starts the face tower before the fingerprint arrives.
+# Sessions live in one worker's memory, so with several workers they need sticky routing
+# and are off unless enabled explicitly.
+app.config['CAPTURE_SESSIONS_ENABLED'] = os.environ.get(
+    'CAPTURE_SESSIONS_ENABLED', '1' if app.config['WEB_WORKERS'] == 1 else '0') == '1'
+app.config['CAPTURE_SESSION_TTL_S'] = float(os.environ.get('CAPTURE_SESSION_TTL_S', 60))
+app.config['CAPTURE_SESSION_MAX'] = int(os.environ.get('CAPTURE_SESSION_MAX', 1024))
+# AuthenticationLog rows are inserted in bulk by a background writer (AUTH_LOG_ASYNC=0 writes them in the request).
+app.config['AUTH_LOG_ASYNC'] = os.environ.get('AUTH_LOG_ASYNC', '1') == '1'
+app.config['AUTH_LOG_BATCH'] = int(os.environ.get('AUTH_LOG_BATCH', 256))
+app.config['AUTH_LOG_FLUSH_MS'] = float(os.environ.get('AUTH_LOG_FLUSH_MS', 1000))
+app.config['AUTH_LOG_QUEUE_DEPTH'] = int(os.environ.get('AUTH_LOG_QUEUE_DEPTH', 10000))
+app.config['AUTH_LOG_BLOCK_MS'] = float(os.environ.get('AUTH_LOG_BLOCK_MS', 50))
+app.config['WARMUP_ON_START'] = os.environ.get('WARMUP_ON_START', '1') == '1'
+# A failed warm-up (e.g. the inference server still loading) is retried after WARMUP_RETRY_S.
+app.config['WARMUP_RETRY_S'] = float(os.environ.get('WARMUP_RETRY_S', 5))
+app.config['INFERENCE_READY_TIMEOUT_S'] = float(os.environ.get('INFERENCE_READY_TIMEOUT_S', 60))
+# Set by gunicorn.conf.py when the app is imported once in the master and forked into workers.
+app.config['MODEL_PRELOAD'] = os.environ.get('MODEL_PRELOAD') == '1'
+app.config['WARMUP_BATCH_SIZES'] = [int(b) for b in os.environ.get(
+    'WARMUP_BATCH_SIZES', ','.join(map(str, range(1, app.config['INFERENCE_MAX_BATCH'] + 1)))).split(',')]
 
 db = SQLAlchemy(app)
 
-# Auto-create database tables on startup
-with app.app_context():
-    db.create_all()
-    print(' Database tables initialized')
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(200))
-    multimodal_hash = db.Column(db.Text)
+    multimodal_hash = db.Column(db.Text)  # legacy comma-separated bits, see db_init.py migrate
+    hash_template = db.Column(db.LargeBinary(16))
+    fp_hash_template = db.Column(db.LargeBinary)  # fingerprint code for cascade identification
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
@@ -47,6 +129,16 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+class GalleryState(db.Model):
+    """
+    Single row versioning the enrolled gallery. version is bumped with every
+    change to it; rebuild_version records the last change that was not a
+    plain registration, after which workers reload the gallery in full.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    rebuild_version = db.Column(db.Integer, nullable=False, default=0)
+
 class AuthenticationLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -55,95 +147,479 @@ class AuthenticationLog(db.Model):
     hamming_distance = db.Column(db.Float)
     auth_method = db.Column(db.String(50))
 
-# Neural Network Models
-class MarginCosineHead(nn.Module):
-    def __init__(self, feature_dim, num_classes, scale=30.0, margin=0.35):
-        super().__init__()
-        self.scale = scale
-        self.margin = margin
-        self.weight = nn.Parameter(torch.randn(num_classes, feature_dim))
-        nn.init.xavier_uniform_(self.weight)
-
-    def forward(self, embeddings, labels=None):
-        W = F.normalize(self.weight, dim=1)
-        x = F.normalize(embeddings, dim=1)
-        cosine = torch.matmul(x, W.t())
-        if labels is None:
-            return cosine * self.scale
-        one_hot = F.one_hot(labels, num_classes=W.size(0)).float().to(embeddings.device)
-        logits = cosine - one_hot * self.margin
-        return logits * self.scale
-
-class MultimodalHashNet(nn.Module):
-    def __init__(self, num_classes=1000, hash_bits=128):
-        super().__init__()
-        self.face_model = resnet50(weights="IMAGENET1K_V2")
-        self.face_model.fc = nn.Identity()
-        
-        self.fp_model = resnet18(weights="IMAGENET1K_V1")
-        old_conv = self.fp_model.conv1
-        self.fp_model.conv1 = nn.Conv2d(1, old_conv.out_channels,
-            kernel_size=old_conv.kernel_size, stride=old_conv.stride,
-            padding=old_conv.padding, bias=False)
-        self.fp_model.fc = nn.Identity()
-        
-        self.fusion = nn.Sequential(
-            nn.Linear(2048 + 512, 1024),
-            nn.BatchNorm1d(1024),
-            nn.ReLU(inplace=True)
-        )
-        self.hash_layer = nn.Linear(1024, hash_bits)
-        self.margin_head = MarginCosineHead(hash_bits, num_classes)
-
-    def forward(self, face, fp, labels=None):
-        f_face = self.face_model(face)
-        f_fp = self.fp_model(fp)
-        fused = torch.cat([f_face, f_fp], dim=1)
-        fused = self.fusion(fused)
-        h = torch.tanh(self.hash_layer(fused))
-        logits = None if labels is None else self.margin_head(h, labels)
-        return h, logits
-
-model = MultimodalHashNet(num_classes=1000, hash_bits=128).to(device)
-model.eval()
-
-face_transform = T.Compose([
-    T.Resize((112, 112)),
-    T.ToTensor(),
-    T.Normalize([0.5, 0.5, 0.5], [0.5, 0.5, 0.5])
-])
-
-fp_transform = T.Compose([
-    T.Grayscale(num_output_channels=1),
-    T.Resize((112, 112)),
-    T.ToTensor(),
-    T.Normalize([0.5], [0.5])
-])
-
-def decode_base64_image(base64_string):
+# Auto-create missing database tables on startup (existing tables are not
+# altered; new columns on an existing database come from db_init.py migrate)
+with app.app_context():
+    db.create_all()
+    print(' Database tables initialized')
+
+# ONNX Runtime and remote serving do not import torch in the web workers.
+uses_torch = app.config['INFERENCE_BACKEND'] not in ('onnx', 'remote')
+device = 'cpu'
+if uses_torch:
+    import torch
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+# With micro-batching every forward pass of a worker (pair hashes, batch
+# identification, fingerprint codes, capture-session fusion) runs on the
+# scheduler thread; without it every request thread can run one. Capture
+# sessions add the face-tower thread, which only the eager model can run.
+# Behind a remote inference server the web workers only preprocess.
+face_tower_thread = app.config['CAPTURE_SESSIONS_ENABLED'] and resolve_backend(
+    app.config['INFERENCE_BACKEND'], app.config['MODEL_TORCHSCRIPT_PATH']) == 'eager'
+thread_budget = apply_thread_budget(compute_budget(
+    workers=app.config['WEB_WORKERS'],
+    concurrency=(1 if app.config['INFERENCE_BATCHING'] else app.config['WEB_THREADS']) + face_tower_thread,
+    intra_op_threads=app.config['INFERENCE_THREADS'] or (1 if app.config['INFERENCE_BACKEND'] == 'remote' else 0),
+    inter_op_threads=app.config['INFERENCE_INTEROP_THREADS']), torch_threads=uses_torch)
+
+inference_backend = load_backend(app.config['INFERENCE_BACKEND'],
+                                 weights_path=app.config['MODEL_WEIGHTS_PATH'],
+                                 torchscript_path=app.config['MODEL_TORCHSCRIPT_PATH'],
+                                 onnx_path=app.config['MODEL_ONNX_PATH'], device=device,
+                                 onnx_threads=app.config['ONNX_INTRA_OP_THREADS'] or thread_budget['intra_op_threads'],
+                                 quantized_path=app.config['MODEL_QUANTIZED_PATH'],
+                                 fold_batchnorm=app.config['INFERENCE_FOLD_BN'],
+                                 profile=app.config['INFERENCE_PROFILE'],
+                                 socket_path=app.config['INFERENCE_SOCKET'])
+if app.config['MODEL_PRELOAD']:
+    inference_backend.share_memory()
+
+image_admission = ImageAdmission(max_bytes=app.config['IMAGE_MAX_BYTES'],
+                                 max_pixels=app.config['IMAGE_MAX_PIXELS'],
+                                 min_side=app.config['IMAGE_MIN_SIDE'], formats=app.config['IMAGE_FORMATS'])
+
+# Line breaks and spaces some encoders wrap base64 with; anything else invalid is rejected.
+BASE64_WHITESPACE = str.maketrans('', '', ' \t\r\n')
+
+def decode_base64_image(base64_string, draft=True):
+    if not isinstance(base64_string, str):
+        image_admission.reject('malformed', 'Image must be a base64 string')
     if ',' in base64_string:
         base64_string = base64_string.split(',')[1]
-    image_data = base64.b64decode(base64_string)
-    return Image.open(io.BytesIO(image_data))
-
-def generate_hash(face_img, fp_img):
-    with torch.no_grad():
-        if face_img.mode != 'RGB':
-            face_img = face_img.convert('RGB')
-        face_tensor = face_transform(face_img).unsqueeze(0).to(device)
-        fp_tensor = fp_transform(fp_img).unsqueeze(0).to(device)
-        h, _ = model(face_tensor, fp_tensor, labels=None)
-        return (h > 0).float().cpu().squeeze(0).numpy()
+    image_admission.check_size(len(base64_string) * 3 // 4)  # before spending a decode on it
+    try:
+        image_data = base64.b64decode(base64_string.translate(BASE64_WHITESPACE), validate=True)
+    except binascii.Error:
+        image_admission.reject('malformed', 'Image is not valid base64')
+    return image_admission.open(io.BytesIO(image_data), len(image_data), draft=draft)
+
+def open_upload(upload, draft=True):
+    stream = upload.stream
+    stream.seek(0, io.SEEK_END)
+    nbytes = stream.tell()
+    stream.seek(0)
+    return image_admission.open(stream, nbytes, draft=draft)
+
+@app.before_request
+def reject_oversized_body():
+    if request.content_length is not None and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        image_admission.record_rejection('request_too_large')
+        return jsonify({'error': f'Request body is {request.content_length} bytes, '
+                                 f"the limit is {app.config['MAX_CONTENT_LENGTH']}",
+                        'reason': 'request_too_large'}), 413
+
+# Request field -> (array conversion, quality gate modality)
+IMAGE_FIELDS = {'face_image': (face_array, 'face'), 'fingerprint_image': (fp_array, 'fingerprint')}
+NUMERIC_FIELDS = ('threshold', 'top_k')
+
+decode_pool = DecodePool(app.config['DECODE_POOL_WORKERS'])
+quality_gate = QualityGate(min_brightness=app.config['QUALITY_MIN_BRIGHTNESS'],
+                           max_brightness=app.config['QUALITY_MAX_BRIGHTNESS'],
+                           min_contrast=app.config['QUALITY_MIN_CONTRAST'],
+                           min_sharpness=app.config['QUALITY_MIN_SHARPNESS'],
+                           min_ridge_energy=app.config['QUALITY_MIN_RIDGE_ENERGY']) \
+    if app.config['QUALITY_GATE_ENABLED'] else None
+
+def decode_to_array(source, field):
+    """Base64 string (JSON) or uploaded file part (multipart) -> resized uint8 model-input array."""
+    to_array, modality = IMAGE_FIELDS[field]
+    # Fingerprints are quality-checked near their native resolution, which
+    # JPEG draft decoding (down to ~112 px) would throw away.
+    native_check = modality == 'fingerprint' and quality_gate is not None
+    draft = app.config['JPEG_DRAFT_DECODE'] and not native_check
+    img = open_upload(source, draft) if isinstance(source, FileStorage) else decode_base64_image(source, draft)
+    array = to_array(img)
+    if quality_gate is not None:
+        quality_gate.check(modality, array, ridge_patch(img) if native_check else None)
+    return array
+
+def decode_images(sources):
+    """Decode (source, field) pairs concurrently on the decode pool, in order."""
+    return decode_pool.run([(decode_to_array, source, field) for source, field in sources])
+
+def parse_numeric_fields(data):
+    """Convert numeric fields sent as strings (form values) in place; anything non-numeric is a 400."""
+    for field in NUMERIC_FIELDS:
+        value = data.get(field)
+        if value is None:
+            continue
+        if isinstance(value, str):
+            try:
+                value = float(value)
+            except ValueError:
+                value = None
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            value = None
+        # JSON also admits NaN and Infinity.
+        if value is None or not math.isfinite(value):
+            raise RequestRejectedError(f'invalid_{field}', f'{field} must be a number')
+        data[field] = value
+    return data
+
+def read_payload():
+    """
+    Request fields, with the biometric images still encoded: JSON bodies
+    carry base64 images, multipart/form-data requests carry them as binary
+    file parts (read straight from the uploaded stream once decoded) and
+    their other fields as form values. Routes check tokens and cheap fields
+    first and only then call decode_payload_images.
+    """
+    try:
+        data = request.json if request.is_json else request.form.to_dict()
+    except RequestEntityTooLarge:
+        # Bodies without a Content-Length are cut off while streaming.
+        image_admission.reject('request_too_large', 'Request body exceeds the upload limit', 413)
+    if request.is_json:
+        return parse_numeric_fields(data)
+    parse_numeric_fields(data)
+    data.update({field: request.files[field] for field in IMAGE_FIELDS if field in request.files})
+    return data
+
+def decode_payload_images(data, fields=tuple(IMAGE_FIELDS)):
+    """
+    Replace the given image fields of read_payload output with resized
+    uint8 arrays (see preprocessing.face_array / fp_array), decoded at once
+    on the decode pool.
+    """
+    present = [field for field in fields if field in data]
+    if present:
+        data.update(zip(present, decode_images([(data[field], field) for field in present])))
+    return data
+
+# Batches are normalized in one step into reusable float32 buffers, pinned
+# when they feed a GPU.
+batch_preprocessor = BatchPreprocessor(capacity=app.config['INFERENCE_MAX_BATCH'], pin_memory=device == 'cuda')
+
+def hash_arrays(array_pairs):
+    """Run one batched forward pass over resized (face, fp) uint8 array pairs."""
+    face_batch, fp_batch = batch_preprocessor.normalize(array_pairs)
+    return inference_backend.hash_batch(face_batch, fp_batch)
+
+def fp_code_arrays(fp_arrays):
+    """(fingerprint code, tower features) of fp_array outputs; only the ResNet18 tower runs."""
+    codes, features = inference_backend.fp_code_batch(batch_preprocessor.normalize_fingerprints(fp_arrays))
+    return list(zip(codes, features))
+
+def fp_feature_hash_arrays(feature_pairs):
+    """Hashes from (resized face array, fp_code_arrays features) pairs; the fingerprint tower is not rerun."""
+    face_batch = batch_preprocessor.normalize_faces([face_u8 for face_u8, _ in feature_pairs])
+    fp_features = np.stack([features for _, features in feature_pairs])
+    return inference_backend.hash_from_fp_features(face_batch, fp_features)
+
+def fused_hash_arrays(feature_pairs):
+    """Hashes from (face_feature_arrays row, resized fingerprint array) pairs."""
+    face_features = np.stack([features for features, _ in feature_pairs])
+    fp_batch = batch_preprocessor.normalize_fingerprints([fp_u8 for _, fp_u8 in feature_pairs])
+    return inference_backend.hash_from_face_features(face_features, fp_batch)
+
+INFERENCE_KINDS = {'hash': hash_arrays, 'fp': fp_code_arrays, 'fp_fusion': fp_feature_hash_arrays,
+                   'fusion': fused_hash_arrays}
+
+def run_inference(items):
+    """Run (kind, item) pairs of the INFERENCE_KINDS, as one batch per kind."""
+    results = [None] * len(items)
+    for kind, run_batch in INFERENCE_KINDS.items():
+        rows = [i for i, (item_kind, _) in enumerate(items) if item_kind == kind]
+        if rows:
+            for i, result in zip(rows, run_batch([items[i][1] for i in rows])):
+                results[i] = result
+    return results
+
+# Concurrent requests are coalesced into batched forward passes, and all of
+# a worker's inference runs on this one thread so the thread budget holds.
+# A remote inference server batches across all web workers itself.
+hash_scheduler = InferenceScheduler(
+    run_inference, max_batch_size=app.config['INFERENCE_MAX_BATCH'],
+    max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS'],
+    max_queue_depth=app.config['INFERENCE_QUEUE_DEPTH']) \
+    if app.config['INFERENCE_BATCHING'] and inference_backend.name != 'remote' else None
+
+def infer(kind, items):
+    """Results of INFERENCE_KINDS[kind] for items, through hash_scheduler when batching."""
+    if hash_scheduler is None:
+        return INFERENCE_KINDS[kind](items)
+    futures = [hash_scheduler.submit_async((kind, item)) for item in items]
+    return [future.result() for future in futures]
+
+def fp_code(fp_u8):
+    """(fingerprint code, tower features) of one fp_array output; pass the features to generate_hash."""
+    return infer('fp', [fp_u8])[0]
+
+def face_feature_arrays(face_arrays):
+    """Run the face tower alone over resized face uint8 arrays."""
+    return inference_backend.face_feature_batch(batch_preprocessor.normalize_faces(face_arrays))
+
+def hash_from_face_features(face_features, fp_u8):
+    """Finish a hash from one face_feature_arrays row and a resized fingerprint array."""
+    return infer('fusion', [(face_features, fp_u8)])[0]
+
+# Face towers started by capture sessions run, and batch, on their own
+# scheduler thread so the request that opened the session returns at once.
+capture_enabled = app.config['CAPTURE_SESSIONS_ENABLED'] and inference_backend.split_towers
+face_scheduler = InferenceScheduler(
+    face_feature_arrays, max_batch_size=app.config['INFERENCE_MAX_BATCH'],
+    max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS'],
+    max_queue_depth=app.config['INFERENCE_QUEUE_DEPTH'], name='face-tower') if capture_enabled else None
+capture_sessions = CaptureSessions(max_sessions=app.config['CAPTURE_SESSION_MAX'],
+                                   ttl_seconds=app.config['CAPTURE_SESSION_TTL_S']) if capture_enabled else None
+
+hash_cache = HashCache(app.config['HASH_CACHE_SIZE'], app.config['HASH_CACHE_TTL_S']) \
+    if app.config['HASH_CACHE_ENABLED'] else None
+
+def compute_hash(face_u8, fp_u8, fp_features=None):
+    if fp_features is not None:
+        return infer('fp_fusion', [(face_u8, fp_features)])[0]
+    return infer('hash', [(face_u8, fp_u8)])[0]
+
+def generate_hash(face_u8, fp_u8, fp_features=None):
+    """
+    Hash of one decoded pair (face_array / fp_array output). fp_features
+    from fp_code, when given, saves running the fingerprint tower again.
+    """
+    if hash_cache is None:
+        return compute_hash(face_u8, fp_u8, fp_features)
+    key = array_pair_digest(face_u8, fp_u8)
+    result = hash_cache.get(key)
+    if result is None:
+        result = compute_hash(face_u8, fp_u8, fp_features)
+        result.setflags(write=False)  # shared between requests
+        hash_cache.put(key, result)
+    return result
 
 def hamming_distance(hash1, hash2):
     return np.sum(hash1 != hash2)
 
-def hash_to_string(hash_array):
-    return ','.join(map(str, hash_array.astype(int).tolist()))
-
 def string_to_hash(hash_string):
     return np.array([float(x) for x in hash_string.split(',')])
 
+def stored_hash(user):
+    """Enrolled hash of a user, read from the packed template or the legacy text column."""
+    if user.hash_template is not None:
+        return bytes_to_hash(user.hash_template)
+    return string_to_hash(user.multimodal_hash)
+
+def has_enrolled_hash():
+    return db.or_(User.hash_template.isnot(None),
+                  db.and_(User.multimodal_hash.isnot(None), User.multimodal_hash != ''))
+
+def rows_to_words(rows):
+    """Packed gallery words for (id, hash_template, multimodal_hash) rows."""
+    words = np.empty((len(rows), 2), dtype=np.uint64)
+    packed = [i for i, r in enumerate(rows) if r.hash_template is not None]
+    legacy = [i for i, r in enumerate(rows) if r.hash_template is None]
+    if packed:
+        words[packed] = bytes_to_words([rows[i].hash_template for i in packed])
+    if legacy:
+        words[legacy] = pack_hash(np.array([string_to_hash(rows[i].multimodal_hash) for i in legacy]))
+    return words
+
+gallery = create_index(app.config['GALLERY_INDEX_ENGINE'],
+                       **({'num_tables': app.config['GALLERY_MIH_TABLES']}
+                          if app.config['GALLERY_INDEX_ENGINE'] == 'mih' else {}))
+# Fingerprint codes of the same users, plus the ids enrolled without one
+# (before the code head existed), which cascade identification never prunes.
+if app.config['CASCADE_IDENTIFICATION'] and not inference_backend.fp_hash_bits:
+    raise RuntimeError('CASCADE_IDENTIFICATION=1 requires the eager backend and a weight bundle '
+                       'with a fingerprint code head (export_model.py bundle --fp-hash-bits)')
+fp_gallery = GalleryIndex(inference_backend.fp_hash_bits) if app.config['CASCADE_IDENTIFICATION'] else None
+cascade_radius = app.config['CASCADE_FP_RADIUS'] if app.config['CASCADE_FP_RADIUS'] is not None \
+    else inference_backend.fp_hash_bits // 4
+cascade_stats = {'probes': 0, 'rejected_early': 0, 'candidates': 0}
+cascade_lock = threading.Lock()
+gallery_state = {'version': None, 'rebuild_version': None, 'max_id': None, 'loaded_at': 0.0,
+                 'fp_missing': np.empty(0, dtype=np.int64)}
+gallery_lock = threading.Lock()
+
+def split_fp_rows(rows):
+    """(ids, packed fingerprint codes) of rows with a current-size code, and the ids of the rest."""
+    size = fp_gallery.hash_bits // 8
+    indexed = [r for r in rows if r.fp_hash_template is not None and len(r.fp_hash_template) == size]
+    indexed_ids = {r.id for r in indexed}
+    missing = np.array([r.id for r in rows if r.id not in indexed_ids], dtype=np.int64)
+    return ([r.id for r in indexed], bytes_to_words([r.fp_hash_template for r in indexed], fp_gallery.hash_bits),
+            missing)
+
+def bump_gallery_version(rebuild=False):
+    """
+    Record a gallery change in the caller's transaction. Registrations are
+    appended by the workers; pass rebuild=True for anything else
+    (deactivation, re-enrollment, template migration) to force a full reload.
+    """
+    values = {'version': GalleryState.version + 1}
+    if rebuild:
+        values['rebuild_version'] = GalleryState.version + 1
+    result = db.session.execute(db.update(GalleryState).where(GalleryState.id == 1).values(**values))
+    if not result.rowcount:
+        db.session.add(GalleryState(id=1, version=1, rebuild_version=1 if rebuild else 0))
+
+def sync_gallery():
+    """
+    Bring the in-memory gallery in line with the active users in the
+    database. Costs one primary-key lookup of the gallery version when
+    nothing changed.
+    """
+    state = db.session.get(GalleryState, 1)
+    version, rebuild_version = (state.version, state.rebuild_version) if state is not None else (0, 0)
+    stale = time.monotonic() - gallery_state['loaded_at'] > app.config['GALLERY_REFRESH_S']
+    if version == gallery_state['version'] and not stale:
+        return
+    # A periodic refresh already running elsewhere is not waited for: with
+    # the version unchanged, the current snapshot is still correct to serve.
+    if version == gallery_state['version'] and gallery_lock.locked():
+        return
+    with gallery_lock:
+        stale = time.monotonic() - gallery_state['loaded_at'] > app.config['GALLERY_REFRESH_S']
+        if version == gallery_state['version'] and not stale:
+            return
+        active = (User.is_active.is_(True), has_enrolled_hash())
+        query = db.session.query(User.id, User.hash_template, User.multimodal_hash,
+                                 User.fp_hash_template).filter(*active)
+        rows = None
+        if not stale and rebuild_version == gallery_state['rebuild_version']:
+            rows = query.filter(User.id > gallery_state['max_id']).all()
+            # Every version step since the last sync is one registration; any
+            # other count means a registration committed out of id order (or
+            # a change that skipped bump_gallery_version), so reload in full.
+            if len(rows) != version - gallery_state['version']:
+                rows = None
+        if rows is not None:
+            gallery.add([r.id for r in rows], rows_to_words(rows), packed=True)
+            if fp_gallery is not None:
+                fp_ids, fp_words, missing = split_fp_rows(rows)
+                fp_gallery.add(fp_ids, fp_words, packed=True)
+                gallery_state['fp_missing'] = np.concatenate([gallery_state['fp_missing'], missing])
+            max_id = max([gallery_state['max_id']] + [r.id for r in rows])
+        else:
+            rows = query.all()
+            gallery.build([r.id for r in rows], rows_to_words(rows), packed=True)
+            if fp_gallery is not None:
+                fp_ids, fp_words, gallery_state['fp_missing'] = split_fp_rows(rows)
+                fp_gallery.build(fp_ids, fp_words, packed=True)
+            max_id = max((r.id for r in rows), default=0)
+            gallery_state['loaded_at'] = time.monotonic()
+        gallery_state.update(version=version, rebuild_version=rebuild_version, max_id=max_id)
+
+def cascade_nearest(face_u8, fp_u8):
+    """
+    gallery.nearest for cascade identification: the fingerprint code
+    shortlists up to CASCADE_SHORTLIST users within cascade_radius (users
+    enrolled without a code always stay in), and only then does the face
+    tower run to compare the fused hash against that shortlist, reusing the
+    fingerprint tower's features. A probe whose fingerprint is close to
+    nobody is rejected without the face tower.
+    """
+    code, fp_features = fp_code(fp_u8)
+    matches = fp_gallery.top_k(code, k=app.config['CASCADE_SHORTLIST'])[0]
+    shortlist = np.concatenate([np.array([user_id for user_id, distance in matches if distance <= cascade_radius],
+                                         dtype=np.int64), gallery_state['fp_missing']])
+    with cascade_lock:
+        cascade_stats['probes'] += 1
+        cascade_stats['candidates'] += len(shortlist)
+        cascade_stats['rejected_early'] += not len(shortlist)
+    if not len(shortlist):
+        return None, None
+    ids, distances = gallery.distances_to(generate_hash(face_u8, fp_u8, fp_features), shortlist)
+    if not len(ids):
+        return None, None
+    best = int(np.argmin(distances))
+    return int(ids[best]), int(distances[best])
+
+def cascade_metrics():
+    if fp_gallery is None:
+        return {'enabled': False}
+    with cascade_lock:
+        stats = dict(cascade_stats)
+    return {
+        'enabled': True,
+        'fp_hash_bits': fp_gallery.hash_bits,
+        'shortlist': app.config['CASCADE_SHORTLIST'],
+        'radius': cascade_radius,
+        'fp_indexed': len(fp_gallery),
+        'fp_missing': len(gallery_state['fp_missing']),
+        'probes': stats['probes'],
+        'rejected_early': stats['rejected_early'],
+        'avg_candidates': stats['candidates'] / stats['probes'] if stats['probes'] else 0.0,
+    }
+
+def warm_model():
+    """Synthetic forward passes through the serving path at every configured batch size."""
+    inference_backend.wait_ready(timeout=app.config['INFERENCE_READY_TIMEOUT_S'])
+    face_img, fp_img = Image.new('RGB', (112, 112), (128, 128, 128)), Image.new('L', (112, 112), 128)
+    arrays = to_arrays(face_img, fp_img)
+    for batch_size in app.config['WARMUP_BATCH_SIZES']:
+        hash_arrays([arrays] * batch_size)
+    compute_hash(*arrays)
+    if inference_backend.fp_hash_bits:
+        compute_hash(arrays[0], arrays[1], fp_code(arrays[1])[1])
+    if face_scheduler is not None:
+        hash_from_face_features(face_scheduler.submit(arrays[0]), arrays[1])
+
+def warm_gallery():
+    # Best effort: login() syncs the gallery itself, so a database that is
+    # not reachable yet must not keep the worker out of rotation.
+    try:
+        with app.app_context():
+            sync_gallery()
+    except Exception as e:
+        print(f' Gallery preload skipped: {e}')
+
+warmup = Warmup([('model', warm_model), ('gallery', warm_gallery)], retry_interval_s=app.config['WARMUP_RETRY_S'])
+# With a preloaded app the master must not run inference (thread pools do
+# not survive fork), so warm-up waits for on_worker_start in each worker.
+if app.config['WARMUP_ON_START'] and not app.config['MODEL_PRELOAD']:
+    warmup.start()
+
+def on_worker_start():
+    """Per-worker setup after gunicorn forks a preloaded app."""
+    with app.app_context():
+        db.engine.dispose(close=False)
+    if app.config['WARMUP_ON_START']:
+        warmup.start()
+
+def on_worker_exit():
+    """Per-worker teardown: write out queued authentication log records."""
+    if auth_log_writer is not None:
+        auth_log_writer.close()
+
+def write_auth_logs(records):
+    # Own app context, and so its own session: this runs on the writer
+    # thread, or inline on a request thread whose session must not commit.
+    with app.app_context():
+        db.session.execute(db.insert(AuthenticationLog), records)
+        db.session.commit()
+
+auth_log_writer = AuthLogWriter(write_auth_logs, max_batch=app.config['AUTH_LOG_BATCH'],
+                                flush_interval_s=app.config['AUTH_LOG_FLUSH_MS'] / 1000.0,
+                                max_queue_depth=app.config['AUTH_LOG_QUEUE_DEPTH'],
+                                block_timeout_s=app.config['AUTH_LOG_BLOCK_MS'] / 1000.0) \
+    if app.config['AUTH_LOG_ASYNC'] else None
+if auth_log_writer is not None:
+    atexit.register(auth_log_writer.close)
+
+def log_authentication(user_id, success, distance, auth_method):
+    """
+    Record an authentication attempt. With the background writer the row
+    is queued and inserted later; otherwise it is added to the request's
+    session, and the caller's commit writes it.
+    """
+    record = {'user_id': user_id, 'timestamp': datetime.utcnow(), 'success': bool(success),
+              'hamming_distance': float(distance) if distance is not None else None, 'auth_method': auth_method}
+    if auth_log_writer is not None:
+        auth_log_writer.submit(record)
+    else:
+        db.session.add(AuthenticationLog(**record))
+
 def generate_token(user_id):
     payload = {'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=24)}
     return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
@@ -155,42 +631,112 @@ def verify_token(token):
     except:
         return None
 
+def is_ready():
+    return warmup.ready or not app.config['WARMUP_ON_START']
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'model_loaded': True, 'device': device})
+    ready = is_ready()
+    return jsonify({'status': 'healthy' if ready else 'warming_up', 'live': True, 'ready': ready,
+                    'model_loaded': True, 'device': device, 'model_format': inference_backend.name,
+                    'warmup': warmup.status(), 'threads': thread_budget}), 200 if ready else 503
+
+@app.route('/api/health/live', methods=['GET'])
+def liveness_check():
+    return jsonify({'live': True})
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    ready = is_ready()
+    return jsonify({'ready': ready, 'warmup': warmup.status()}), 200 if ready else 503
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify({
+        'inference_scheduler': hash_scheduler.metrics() if hash_scheduler is not None else {'enabled': False},
+        'gallery': {'engine': gallery.engine, 'size': len(gallery)},
+        'image_admission': image_admission.metrics(),
+        'decode_pool': decode_pool.metrics(),
+        'quality_gate': quality_gate.metrics() if quality_gate is not None else {'enabled': False},
+        'hash_cache': hash_cache.metrics() if hash_cache is not None else {'enabled': False},
+        'cascade': cascade_metrics(),
+        'capture_sessions': {**capture_sessions.metrics(), 'face_tower': face_scheduler.metrics()}
+                            if capture_sessions is not None else {'enabled': False},
+        'auth_log_writer': auth_log_writer.metrics() if auth_log_writer is not None else {'enabled': False},
+        'inference_backend': inference_backend.info(),
+    })
 
 @app.route('/api/register', methods=['POST'])
 def register():
     try:
-        data = request.json
+        data = read_payload()
         if not all(k in data for k in ['username', 'email', 'password', 'face_image', 'fingerprint_image']):
             return jsonify({'error': 'Missing required fields'}), 400
         if User.query.filter_by(username=data['username']).first():
             return jsonify({'error': 'Username already exists'}), 400
         if User.query.filter_by(email=data['email']).first():
             return jsonify({'error': 'Email already exists'}), 400
+        decode_payload_images(data)
         
-        face_img = decode_base64_image(data['face_image'])
-        fp_img = decode_base64_image(data['fingerprint_image'])
-        multimodal_hash = generate_hash(face_img, fp_img)
+        fp_template, fp_features = None, None
+        if inference_backend.fp_hash_bits:
+            code, fp_features = fp_code(data['fingerprint_image'])
+            fp_template = hash_to_bytes(code)
+        multimodal_hash = generate_hash(data['face_image'], data['fingerprint_image'], fp_features)
         
         user = User(username=data['username'], email=data['email'],
-                   multimodal_hash=hash_to_string(multimodal_hash))
+                   hash_template=hash_to_bytes(multimodal_hash), fp_hash_template=fp_template)
         user.set_password(data['password'])
         db.session.add(user)
+        bump_gallery_version()
         db.session.commit()
         
         token = generate_token(user.id)
         return jsonify({'message': 'User registered successfully',
                        'user_id': user.id, 'username': user.username, 'token': token}), 201
+    except RequestRejectedError as e:
+        return jsonify({'error': str(e), 'reason': e.reason}), e.status
+    except SchedulerBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def identify(face_u8, fp_u8, threshold):
+    """(user_id, distance) of the closest enrolled user to a decoded pair."""
+    sync_gallery()
+    if fp_gallery is not None:
+        return cascade_nearest(face_u8, fp_u8)
+    return gallery.nearest(generate_hash(face_u8, fp_u8), max_distance=threshold)
+
+def biometric_login_response(best_id, min_distance, threshold):
+    """Log a biometric identification attempt and answer it with a token or a 401."""
+    best_match = User.query.get(best_id) if best_id is not None else None
+    
+    # Every attempt is logged, whatever the engine: a probe that pruned
+    # search or the cascade matched to nobody is a failure without a user.
+    if best_match:
+        log_authentication(best_match.id, min_distance <= threshold, min_distance, 'multimodal')
+    else:
+        log_authentication(None, False, None, 'multimodal')
+    
+    if best_match and min_distance <= threshold:
+        best_match.last_login = datetime.utcnow()
+        db.session.commit()
+        token = generate_token(best_match.id)
+        return jsonify({'message': 'Biometric authentication successful',
+                      'user_id': best_match.id, 'username': best_match.username,
+                      'token': token, 'hamming_distance': float(min_distance),
+                      'auth_method': 'biometric'})
+    if auth_log_writer is None:
+        db.session.commit()
+    return jsonify({'error': 'Biometric authentication failed',
+                  'hamming_distance': float(min_distance) if best_match else None}), 401
+
 @app.route('/api/login', methods=['POST'])
 def login():
     try:
-        data = request.json
+        data = read_payload()
         if 'username' in data and 'password' in data:
             user = User.query.filter_by(username=data['username']).first()
             if not user or not user.check_password(data['password']):
@@ -204,48 +750,77 @@ def login():
                           'username': user.username, 'token': token, 'auth_method': 'password'})
         
         elif 'face_image' in data and 'fingerprint_image' in data:
-            face_img = decode_base64_image(data['face_image'])
-            fp_img = decode_base64_image(data['fingerprint_image'])
-            input_hash = generate_hash(face_img, fp_img)
-            
-            best_match = None
-            min_distance = float('inf')
+            decode_payload_images(data)
             threshold = data.get('threshold', 15)
-            
-            for user in User.query.filter_by(is_active=True).all():
-                if user.multimodal_hash:
-                    stored_hash = string_to_hash(user.multimodal_hash)
-                    distance = hamming_distance(input_hash, stored_hash)
-                    if distance < min_distance:
-                        min_distance = distance
-                        best_match = user
-            
-            if best_match:
-                log = AuthenticationLog(user_id=best_match.id, success=(min_distance <= threshold),
-                                      hamming_distance=float(min_distance), auth_method='multimodal')
-                db.session.add(log)
-            
-            if best_match and min_distance <= threshold:
-                best_match.last_login = datetime.utcnow()
-                db.session.commit()
-                token = generate_token(best_match.id)
-                return jsonify({'message': 'Biometric authentication successful',
-                              'user_id': best_match.id, 'username': best_match.username,
-                              'token': token, 'hamming_distance': float(min_distance),
-                              'auth_method': 'biometric'})
-            else:
-                db.session.commit()
-                return jsonify({'error': 'Biometric authentication failed',
-                              'hamming_distance': float(min_distance) if best_match else None}), 401
+            return biometric_login_response(*identify(data['face_image'], data['fingerprint_image'], threshold),
+                                            threshold)
         else:
             return jsonify({'error': 'Invalid login method'}), 400
+    except RequestRejectedError as e:
+        return jsonify({'error': str(e), 'reason': e.reason}), e.status
+    except SchedulerBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/capture/face', methods=['POST'])
+def capture_face():
+    """First phase of a two-phase capture: start the face tower and hand back a session id."""
+    if capture_sessions is None:
+        return jsonify({'error': 'Capture sessions are not available with this inference backend'}), 501
+    try:
+        data = read_payload()
+        if 'face_image' not in data:
+            return jsonify({'error': 'Missing face_image'}), 400
+        decode_payload_images(data, ('face_image',))
+        session_id = capture_sessions.open(face_scheduler.submit_async(data['face_image']))
+        return jsonify({'session_id': session_id, 'expires_in': capture_sessions.ttl_seconds}), 201
+    except RequestRejectedError as e:
+        return jsonify({'error': str(e), 'reason': e.reason}), e.status
+    except SchedulerBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/capture/login', methods=['POST'])
+def capture_login():
+    """
+    Second phase: finish the session's hash with the fingerprint and
+    identify like /api/login. Sessions are local to the worker that opened
+    them; when this request lands elsewhere (or the session expired) and it
+    carries face_image again, it falls back to a full login instead of a 404.
+    """
+    if capture_sessions is None:
+        return jsonify({'error': 'Capture sessions are not available with this inference backend'}), 501
+    try:
+        data = read_payload()
+        if 'session_id' not in data or 'fingerprint_image' not in data:
+            return jsonify({'error': 'Missing session_id or fingerprint_image'}), 400
+        # The face is only decoded again if the session cannot be used.
+        decode_payload_images(data, ('fingerprint_image',))
+        threshold = data.get('threshold', 15)
+        try:
+            face_features = capture_sessions.take(data['session_id'])
+        except CaptureSessionError as e:
+            if 'face_image' not in data:
+                return jsonify({'error': str(e)}), 404
+            decode_payload_images(data, ('face_image',))
+            return biometric_login_response(*identify(data['face_image'], data['fingerprint_image'], threshold),
+                                            threshold)
+        input_hash = hash_from_face_features(face_features, data['fingerprint_image'])
+        sync_gallery()
+        return biometric_login_response(*gallery.nearest(input_hash, max_distance=threshold), threshold)
+    except RequestRejectedError as e:
+        return jsonify({'error': str(e), 'reason': e.reason}), e.status
+    except SchedulerBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/verify', methods=['POST'])
 def verify():
     try:
-        data = request.json
+        data = read_payload()
         auth_header = request.headers.get('Authorization')
         if not auth_header:
             return jsonify({'error': 'No authorization token provided'}), 401
@@ -258,21 +833,74 @@ def verify():
         user = User.query.get(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
+        if 'face_image' not in data or 'fingerprint_image' not in data:
+            return jsonify({'error': 'Missing face_image or fingerprint_image'}), 400
+        decode_payload_images(data)
         
-        face_img = decode_base64_image(data['face_image'])
-        fp_img = decode_base64_image(data['fingerprint_image'])
-        input_hash = generate_hash(face_img, fp_img)
-        stored_hash = string_to_hash(user.multimodal_hash)
-        distance = hamming_distance(input_hash, stored_hash)
+        input_hash = generate_hash(data['face_image'], data['fingerprint_image'])
+        distance = hamming_distance(input_hash, stored_hash(user))
         threshold = data.get('threshold', 15)
         
-        log = AuthenticationLog(user_id=user.id, success=(distance <= threshold),
-                              hamming_distance=float(distance), auth_method='verification')
-        db.session.add(log)
-        db.session.commit()
+        log_authentication(user.id, distance <= threshold, distance, 'verification')
+        if auth_log_writer is None:
+            db.session.commit()
         
         return jsonify({'verified': bool(distance <= threshold), 'hamming_distance': float(distance),
                        'threshold': threshold, 'username': user.username})
+    except RequestRejectedError as e:
+        return jsonify({'error': str(e), 'reason': e.reason}), e.status
+    except SchedulerBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/identify/batch', methods=['POST'])
+def identify_batch():
+    try:
+        data = request.json
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return jsonify({'error': 'No authorization token provided'}), 401
+        if not verify_token(auth_header.split(' ')[1]):
+            return jsonify({'error': 'Invalid token'}), 401
+        parse_numeric_fields(data)
+        
+        probes = data.get('probes')
+        if not probes or not isinstance(probes, list):
+            return jsonify({'error': 'probes must be a non-empty list'}), 400
+        if len(probes) > app.config['MAX_IDENTIFY_BATCH']:
+            return jsonify({'error': f"At most {app.config['MAX_IDENTIFY_BATCH']} probes per batch"}), 400
+        threshold = data.get('threshold', 15)
+        top_k = data.get('top_k', 1)
+        if top_k != int(top_k):
+            raise RequestRejectedError('invalid_top_k', 'top_k must be an integer')
+        top_k = min(max(1, int(top_k)), app.config['MAX_IDENTIFY_TOP_K'])
+        
+        sources = []
+        for i, probe in enumerate(probes):
+            if not all(k in probe for k in ['face_image', 'fingerprint_image']):
+                return jsonify({'error': f'Probe {i} is missing face_image or fingerprint_image'}), 400
+            sources.extend((probe[field], field) for field in ('face_image', 'fingerprint_image'))
+        arrays = decode_images(sources)
+        input_hashes = np.stack(infer('hash', list(zip(arrays[0::2], arrays[1::2]))))
+        
+        sync_gallery()
+        matches = gallery.top_k(input_hashes, k=top_k)
+        matched_ids = {user_id for probe_matches in matches for user_id, _ in probe_matches}
+        usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(matched_ids)).all())
+        
+        results = []
+        for i, probe_matches in enumerate(matches):
+            candidates = [{'user_id': user_id, 'username': usernames.get(user_id),
+                           'hamming_distance': float(distance), 'match': bool(distance <= threshold)}
+                          for user_id, distance in probe_matches]
+            results.append({'index': i, 'identified': bool(candidates and candidates[0]['match']),
+                            'matches': candidates})
+        return jsonify({'results': results, 'threshold': threshold, 'top_k': top_k})
+    except RequestRejectedError as e:
+        return jsonify({'error': str(e), 'reason': e.reason}), e.status
+    except SchedulerBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
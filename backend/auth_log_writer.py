@@ -0,0 +1,160 @@
+"""
+Background writer for authentication log records.
+
+AuthenticationLog rows are append-only telemetry, so request threads only
+put a record on a bounded in-process queue and one writer thread inserts
+them in bulk: a batch is flushed once it holds max_batch records or
+flush_interval_s after its first record arrived, whichever comes first, and
+everything still queued is flushed on close(). When the queue is full a
+request thread waits up to block_timeout_s for room, then writes its own
+record synchronously, so a stalled database slows requests down instead of
+silently dropping records or growing memory without bound.
+"""
+
+import os
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class AuthLogWriter:
+    def __init__(self, write_batch, max_batch=256, flush_interval_s=1.0, max_queue_depth=10000,
+                 block_timeout_s=0.05, name='auth-log-writer'):
+        """write_batch takes a list of records and persists them in one transaction."""
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self.max_queue_depth = max_queue_depth
+        self.block_timeout_s = block_timeout_s
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue_depth)
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'submitted': 0, 'written': 0, 'failed': 0, 'blocked': 0, 'written_inline': 0,
+                       'flushes': 0, 'flush_ms_total': 0.0, 'flush_ms_max': 0.0, 'max_queue_depth_seen': 0}
+        self._triggers = {'size': 0, 'time': 0, 'shutdown': 0}
+
+    def _ensure_started(self):
+        # Started lazily and per process, like InferenceScheduler: a writer
+        # created before gunicorn forks its workers restarts in each of them.
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue_depth)
+                self._closed = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def submit(self, record):
+        """Queue one record for the writer thread, or write it inline when the queue stays full."""
+        if self._closed and self._pid == os.getpid():
+            self._write([record], inline=True)
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['blocked'] += 1
+            try:
+                self._queue.put(record, timeout=self.block_timeout_s)
+            except queue.Full:
+                self._write([record], inline=True)
+                return
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth_seen'] = max(self._stats['max_queue_depth_seen'], depth)
+
+    def close(self, timeout=10.0):
+        """Flush everything queued so far and stop the writer thread; later records are written inline."""
+        if self._pid != os.getpid() or self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _collect(self):
+        """(batch, trigger) where trigger says why the batch was closed."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], 'shutdown'
+        batch = [first]
+        deadline = time.perf_counter() + self.flush_interval_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return batch, 'time'
+            try:
+                record = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, 'time'
+            if record is _STOP:
+                return batch, 'shutdown'
+            batch.append(record)
+        return batch, 'size'
+
+    def _write(self, batch, inline=False):
+        started = time.perf_counter()
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            print(f' Dropped {len(batch)} authentication log records: {e}')
+            with self._stats_lock:
+                self._stats['failed'] += len(batch)
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with self._stats_lock:
+            self._stats['written'] += len(batch)
+            if inline:
+                self._stats['written_inline'] += len(batch)
+                return
+            self._stats['flushes'] += 1
+            self._stats['flush_ms_total'] += elapsed_ms
+            self._stats['flush_ms_max'] = max(self._stats['flush_ms_max'], elapsed_ms)
+
+    def _run(self):
+        while True:
+            batch, trigger = self._collect()
+            if batch:
+                self._write(batch)
+                with self._stats_lock:
+                    self._triggers[trigger] += 1
+            if trigger == 'shutdown':
+                return
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            triggers = dict(self._triggers)
+        flushes = stats['flushes']
+        return {
+            'enabled': True,
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'max_queue_depth_seen': stats['max_queue_depth_seen'],
+            'max_batch': self.max_batch,
+            'flush_interval_s': self.flush_interval_s,
+            'submitted': stats['submitted'],
+            'written': stats['written'],
+            'written_inline': stats['written_inline'],
+            'failed': stats['failed'],
+            'blocked': stats['blocked'],
+            'flushes': flushes,
+            'flush_triggers': triggers,
+            'avg_batch_size': (stats['written'] - stats['written_inline']) / flushes if flushes else 0.0,
+            'avg_flush_ms': stats['flush_ms_total'] / flushes if flushes else 0.0,
+            'max_flush_ms': stats['flush_ms_max'],
+        }
@@ -0,0 +1,83 @@
+"""
+Benchmark the linear and multi-index hashing gallery engines.
+
+Builds galleries of random 128-bit codes (10^3 .. 10^7 by default), queries
+them with genuine probes (an enrolled code with a few flipped bits) and
+impostor probes (fresh random codes), and reports the per-query latency of
+each engine and the gallery size at which MIH overtakes the linear scan.
+
+Usage: python benchmarks/bench_gallery_index.py [--sizes 1000 10000 ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery_index import HASH_BITS, create_index, unpack_hash  # noqa: E402
+
+
+def make_probes(rng, codes, count, max_flips):
+    """Half genuine probes (enrolled code with <= max_flips bits flipped), half impostors."""
+    genuine = unpack_hash(codes[rng.integers(len(codes), size=count // 2)])
+    for probe in genuine:
+        flips = rng.choice(HASH_BITS, rng.integers(0, max_flips + 1), replace=False)
+        probe[flips] = 1 - probe[flips]
+    impostor = rng.integers(0, 2, (count - len(genuine), HASH_BITS)).astype(np.float32)
+    return np.concatenate([genuine, impostor])
+
+
+def time_queries(index, probes, radius):
+    start = time.perf_counter()
+    for probe in probes:
+        index.nearest(probe, max_distance=radius)
+    return (time.perf_counter() - start) / len(probes) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** e for e in range(3, 8)])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=int, default=15)
+    parser.add_argument('--tables', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f'radius={args.radius} tables={args.tables} queries={args.queries}')
+    print(f'{"gallery":>10} {"build lin ms":>13} {"build mih ms":>13} '
+          f'{"linear us":>10} {"mih us":>10} {"speedup":>8}')
+    crossover = None
+    for size in args.sizes:
+        codes = rng.integers(0, 2 ** 64, (size, 2), dtype=np.uint64)
+        ids = np.arange(size)
+        probes = make_probes(rng, codes, args.queries, args.radius)
+
+        timings = {}
+        for engine, options in (('linear', {}), ('mih', {'num_tables': args.tables})):
+            index = create_index(engine, **options)
+            start = time.perf_counter()
+            index.build(ids, codes, packed=True)
+            build_ms = (time.perf_counter() - start) * 1e3
+            index.nearest(probes[0], max_distance=args.radius)
+            timings[engine] = (build_ms, time_queries(index, probes, args.radius))
+            del index
+
+        speedup = timings['linear'][1] / timings['mih'][1]
+        if crossover is None and speedup > 1:
+            crossover = size
+        print(f'{size:>10} {timings["linear"][0]:>13.1f} {timings["mih"][0]:>13.1f} '
+              f'{timings["linear"][1]:>10.1f} {timings["mih"][1]:>10.1f} {speedup:>7.1f}x')
+
+    if crossover is None:
+        print('MIH did not overtake the linear scan at the sizes tested')
+    else:
+        print(f'MIH overtakes the linear scan from about {crossover} codes')
+
+
+if __name__ == '__main__':
+    main()
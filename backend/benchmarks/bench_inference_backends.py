@@ -0,0 +1,62 @@
+"""
+Latency benchmark for the inference backends behind generate_hash.
+
+Compares eager PyTorch with the optional TorchScript and ONNX Runtime
+artifacts on random preprocessed batches and reports median and p95
+latency per batch size.
+
+Usage: python benchmarks/bench_inference_backends.py --weights BUNDLE
+           [--torchscript ARTIFACT] [--onnx ARTIFACT] [--batch-sizes 1 4 8]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_backends import OnnxBackend, TorchBackend  # noqa: E402
+from model import HashEncoder, load_bundle, load_torchscript  # noqa: E402
+
+
+def measure(backend, batch_size, iterations, warmup=3):
+    rng = np.random.default_rng(0)
+    face = rng.uniform(-1, 1, (batch_size, 3, 112, 112)).astype(np.float32)
+    fp = rng.uniform(-1, 1, (batch_size, 1, 112, 112)).astype(np.float32)
+    for _ in range(warmup):
+        backend.hash_batch(face, fp)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        backend.hash_batch(face, fp)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.median(timings), np.percentile(timings, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare inference backend latency')
+    parser.add_argument('--weights', required=True, help='weight bundle for the eager baseline')
+    parser.add_argument('--torchscript', help='TorchScript artifact to include')
+    parser.add_argument('--onnx', help='ONNX artifact to include')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    backends = [TorchBackend(HashEncoder(load_bundle(args.weights)).eval(), 'eager')]
+    if args.torchscript:
+        backends.append(TorchBackend(load_torchscript(args.torchscript), 'torchscript'))
+    if args.onnx:
+        backends.append(OnnxBackend(args.onnx))
+
+    print(f'{"backend":>12} {"batch":>6} {"p50 ms":>9} {"p95 ms":>9} {"ms/item":>9}')
+    for batch_size in args.batch_sizes:
+        for backend in backends:
+            p50, p95 = measure(backend, batch_size, args.iterations)
+            print(f'{backend.name:>12} {batch_size:>6} {p50:>9.1f} {p95:>9.1f} {p50 / batch_size:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Stability and latency report for the eager inference profiles.
+
+Runs the same inputs through the FP32 NCHW model and through every
+INFERENCE_PROFILE, then reports how many of the 128 sign-thresholded hash
+bits flip against FP32 and the latency at batch 1 and at --batch-size.
+Profiles the host cannot run natively are reported with the profile they
+fell back to.
+
+Usage: python benchmarks/bench_inference_profiles.py --weights BUNDLE
+           [--faces DIR --fingerprints DIR] [--count 64]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_backends import PROFILES, TorchBackend  # noqa: E402
+from model import load_bundle, parity_inputs, prepare_for_inference  # noqa: E402
+
+
+def latency_ms(backend, face, fp, iterations=10, warmup=3):
+    timings = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        backend.hash_batch(face, fp)
+        if i >= warmup:
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bit stability of inference profiles against FP32')
+    parser.add_argument('--weights', required=True, help='weight bundle')
+    parser.add_argument('--faces', help='folder of face images (default: synthetic inputs)')
+    parser.add_argument('--fingerprints', help='folder of fingerprint images')
+    parser.add_argument('--count', type=int, default=64, help='number of inputs to compare')
+    parser.add_argument('--batch-size', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.faces and args.fingerprints:
+        from quantize_model import load_image_pairs
+        pairs = load_image_pairs(args.faces, args.fingerprints, args.count)
+        face = torch.stack([f for f, _ in pairs]).numpy()
+        fp = torch.stack([p for _, p in pairs]).numpy()
+    else:
+        face, fp = (t.numpy() for t in parity_inputs(count=args.count))
+
+    reference = None
+    print(f'{"profile":>14} {"effective":>14} {"flips mean":>11} {"flips max":>10} '
+          f'{"identical":>10} {"b1 ms":>8} {f"b{args.batch_size} ms":>8}')
+    for profile in PROFILES:
+        backend = TorchBackend(prepare_for_inference(load_bundle(args.weights)), 'eager-folded',
+                               profile=profile)
+        bits = backend.hash_batch(face, fp)
+        if reference is None:
+            reference = bits
+        flips = (bits != reference).sum(axis=1)
+        print(f'{profile:>14} {backend.profile:>14} {flips.mean():>11.2f} {flips.max():>10d} '
+              f'{(flips == 0).mean() * 100:>9.1f}% '
+              f'{latency_ms(backend, face[:1], fp[:1]):>8.1f} '
+              f'{latency_ms(backend, face[:args.batch_size], fp[:args.batch_size]):>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
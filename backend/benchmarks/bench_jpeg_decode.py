@@ -0,0 +1,98 @@
+"""
+Full-resolution versus reduced-resolution (Image.draft) JPEG decoding.
+
+For each input resolution, encodes a synthetic photo-like JPEG (or uses the
+given --images), then times decode + preprocessing both ways. It reports the
+size of the decoded intermediate and how far the 112x112 model inputs
+differ. With --weights it also reports how many hash bits flip.
+
+Usage: python benchmarks/bench_jpeg_decode.py [--images DIR] [--weights BUNDLE]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import load_image, preprocess_pair  # noqa: E402
+
+RESOLUTIONS = [(640, 480), (1280, 960), (1920, 1440), (3024, 4032), (4000, 3000), (6000, 4000)]
+
+
+def synthetic_jpeg(width, height, seed=0):
+    """Smooth gradients plus sensor-like noise, so the encoded size resembles a photo."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width, y / height, (x + y) / (width + height)], axis=-1) * 200
+    pixels = np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def decode_pair(data, draft):
+    face_img, fp_img = load_image(io.BytesIO(data), draft=draft), load_image(io.BytesIO(data), draft=draft)
+    decoded = face_img.size
+    face, fp = preprocess_pair(face_img, fp_img)
+    return face, fp, decoded
+
+
+def median_ms(fn, iterations=10, warmup=2):
+    timings = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        fn()
+        if i >= warmup:
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reduced-resolution JPEG decoding')
+    parser.add_argument('--images', help='folder of JPEGs to use instead of synthetic ones')
+    parser.add_argument('--weights', help='weight bundle, to report hash bit flips')
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.images:
+        inputs = []
+        for name in sorted(os.listdir(args.images)):
+            if name.lower().endswith(('.jpg', '.jpeg')):
+                with open(os.path.join(args.images, name), 'rb') as f:
+                    inputs.append((name, f.read()))
+    else:
+        inputs = [(f'{w}x{h}', synthetic_jpeg(w, h)) for w, h in RESOLUTIONS]
+
+    backend = None
+    if args.weights:
+        from inference_backends import TorchBackend
+        from model import load_bundle, prepare_for_inference
+        backend = TorchBackend(prepare_for_inference(load_bundle(args.weights)), 'eager-folded')
+
+    print(f'{"input":>12} {"KiB":>6} {"decoded full":>13} {"decoded draft":>14} {"full ms":>8} '
+          f'{"draft ms":>9} {"speedup":>8} {"max |dx|":>9} {"mean |dx|":>10}' + (' bit flips' if backend else ''))
+    for label, data in inputs:
+        full_face, full_fp, full_size = decode_pair(data, draft=False)
+        draft_face, draft_fp, draft_size = decode_pair(data, draft=True)
+        full_ms = median_ms(lambda: decode_pair(data, draft=False), args.iterations)
+        draft_ms = median_ms(lambda: decode_pair(data, draft=True), args.iterations)
+        diff = torch.cat([(full_face - draft_face).flatten(), (full_fp - draft_fp).flatten()]).abs()
+        line = (f'{label:>12} {len(data) / 1024:>6.0f} {"x".join(map(str, full_size)):>13} '
+                f'{"x".join(map(str, draft_size)):>14} {full_ms:>8.1f} {draft_ms:>9.1f} '
+                f'{full_ms / draft_ms:>7.1f}x {diff.max().item():>9.3f} {diff.mean().item():>10.4f}')
+        if backend is not None:
+            bits = backend.hash_batch(torch.stack([full_face, draft_face]).numpy(),
+                                      torch.stack([full_fp, draft_fp]).numpy())
+            line += f' {int((bits[0] != bits[1]).sum()):>9d}'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-image torchvision transforms versus the vectorized batch preprocessor.
+
+Times turning decoded images into the float32 NCHW batches the backends
+consume: preprocess_pair + torch.stack per image, against to_arrays +
+BatchPreprocessor.normalize. Also checks that both paths give identical
+inputs.
+
+Usage: python benchmarks/bench_preprocessing.py [--batch-sizes 1 8 32] [--size 640x480]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import BatchPreprocessor, preprocess_pair, to_arrays  # noqa: E402
+
+
+def median_ms(fn, iterations=20, warmup=3):
+    timings = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        fn()
+        if i >= warmup:
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch preprocessing')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--size', default='640x480', help='decoded image size WxH')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.split('x'))
+    rng = np.random.default_rng(0)
+    preprocessor = BatchPreprocessor()
+
+    print(f'{"batch":>6} {"torchvision ms":>15} {"vectorized ms":>14} {"speedup":>8} {"identical":>10}')
+    for batch_size in args.batch_sizes:
+        pairs = [(Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)),
+                  Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)))
+                 for _ in range(batch_size)]
+
+        def torchvision_path():
+            tensors = [preprocess_pair(face, fp) for face, fp in pairs]
+            return torch.stack([f for f, _ in tensors]).numpy(), torch.stack([p for _, p in tensors]).numpy()
+
+        def vectorized_path():
+            return preprocessor.normalize([to_arrays(face, fp) for face, fp in pairs])
+
+        (ref_face, ref_fp), (face, fp) = torchvision_path(), vectorized_path()
+        identical = np.array_equal(ref_face, face) and np.array_equal(ref_fp, fp)
+        reference_ms = median_ms(torchvision_path, args.iterations)
+        vectorized_ms = median_ms(vectorized_path, args.iterations)
+        print(f'{batch_size:>6} {reference_ms:>15.2f} {vectorized_ms:>14.2f} '
+              f'{reference_ms / vectorized_ms:>7.1f}x {str(identical):>10}')
+
+
+if __name__ == '__main__':
+    main()
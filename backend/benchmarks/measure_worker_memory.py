@@ -0,0 +1,102 @@
+"""
+Per-worker memory of the gunicorn deployment, with and without preloading.
+
+Starts the API under gunicorn.conf.py for each worker count, waits until
+the workers report ready (warm-up done), then reads /proc/<pid>/smaps_rollup
+for the master and every worker and reports unique (USS = private clean +
+private dirty) and proportional (PSS) set sizes. Linux only.
+
+Usage: MODEL_WEIGHTS_PATH=models/hashnet.pt \\
+       python benchmarks/measure_worker_memory.py [--workers 1 2 4 8] [--mode preload fork]
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def smaps_rollup(pid):
+    """Memory counters in MiB from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'rss': values.get('Rss', 0.0), 'pss': values.get('Pss', 0.0),
+            'uss': values.get('Private_Clean', 0.0) + values.get('Private_Dirty', 0.0)}
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def wait_ready(port, workers, timeout):
+    """Poll readiness until enough consecutive probes succeed to have hit every worker."""
+    deadline, streak = time.time() + timeout, 0
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health/ready', timeout=5):
+                streak += 1
+        except (urllib.error.URLError, OSError):
+            streak = 0
+        if streak >= workers * 4:
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def measure(workers, preload, port, timeout):
+    env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_PRELOAD='1' if preload else '0',
+               PORT=str(port))
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'App:app'],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port, workers, timeout):
+            raise RuntimeError(f'{workers} workers did not become ready within {timeout}s')
+        time.sleep(1)
+        return smaps_rollup(master.pid), [smaps_rollup(pid) for pid in child_pids(master.pid)]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-worker USS/PSS of the gunicorn deployment')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--mode', nargs='+', choices=['preload', 'fork'], default=['preload', 'fork'])
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    print(f'{"mode":>8} {"workers":>8} {"master USS":>11} {"worker USS":>11} {"worker PSS":>11} '
+          f'{"worker RSS":>11} {"total PSS":>10}   (MiB, worker columns are means)')
+    for mode in args.mode:
+        for workers in args.workers:
+            master, children = measure(workers, mode == 'preload', args.port, args.timeout)
+            mean = {key: sum(c[key] for c in children) / len(children) for key in ('uss', 'pss', 'rss')}
+            total_pss = master['pss'] + sum(c['pss'] for c in children)
+            print(f'{mode:>8} {workers:>8} {master["uss"]:>11.0f} {mean["uss"]:>11.0f} {mean["pss"]:>11.0f} '
+                  f'{mean["rss"]:>11.0f} {total_pss:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
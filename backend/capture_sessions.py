@@ -0,0 +1,94 @@
+"""
+Two-phase capture sessions with speculative face-tower inference.
+
+The capture UI usually has the face image seconds before the fingerprint.
+Opening a session with the face starts the ResNet50 face tower right away
+and keeps the Future of its 2048-d feature under a random session id. When
+the fingerprint arrives, only the ResNet18 tower, fusion and hash layer
+are left to run, so the client waits for roughly the fingerprint tower
+alone. Sessions are single-use, expire after ttl_seconds, and the oldest
+are dropped beyond max_sessions.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class CaptureSessionError(LookupError):
+    """The session id is unknown, already used or expired."""
+
+
+class CaptureSessions:
+    def __init__(self, max_sessions=1024, ttl_seconds=60.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'completed': 0, 'expired': 0, 'evicted': 0, 'unknown': 0,
+                       'ready_on_arrival': 0, 'feature_wait_ms_total': 0.0}
+
+    def _purge(self, now):
+        # Sessions are kept in creation order, so expired ones are at the front.
+        while self._sessions:
+            session_id, (_, opened) = next(iter(self._sessions.items()))
+            if now - opened <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self._stats['expired'] += 1
+
+    def open(self, face_features):
+        """Register a Future of face features and return the new session id."""
+        session_id = secrets.token_urlsafe(16)
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            self._sessions[session_id] = (face_features, now)
+            self._stats['opened'] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats['evicted'] += 1
+        return session_id
+
+    def take(self, session_id, timeout=None):
+        """
+        Remove a session and return its face features, waiting for the face
+        tower if it is still running. Raises CaptureSessionError for unknown
+        or expired ids, and re-raises the face tower's exception if it failed.
+        """
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                self._stats['unknown'] += 1
+                raise CaptureSessionError('Unknown or expired capture session')
+        future = entry[0]
+        ready = future.done()
+        started = time.perf_counter()
+        try:
+            return future.result(timeout=timeout)
+        finally:
+            with self._lock:
+                self._stats['completed'] += 1
+                self._stats['ready_on_arrival'] += ready
+                self._stats['feature_wait_ms_total'] += (time.perf_counter() - started) * 1000.0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            active = len(self._sessions)
+        completed = stats.pop('completed')
+        wait_total = stats.pop('feature_wait_ms_total')
+        return {
+            'enabled': True,
+            'active': active,
+            'max_sessions': self.max_sessions,
+            'ttl_seconds': self.ttl_seconds,
+            'completed': completed,
+            **stats,
+            'avg_feature_wait_ms': wait_total / completed if completed else 0.0,
+        }
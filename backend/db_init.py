@@ -1,6 +1,8 @@
-from App import app, db, User, AuthenticationLog
+from App import app, db, User, AuthenticationLog, GalleryState, bump_gallery_version, string_to_hash
+from gallery_index import hash_to_bytes
 import numpy as np
 import sys
+import time
 
 def init_database():
     with app.app_context():
@@ -12,11 +14,12 @@ def create_sample_user():
         if User.query.filter_by(username='demo_user').first():
             print("⚠️  Sample user already exists")
             return
-        sample_hash = ','.join(map(str, np.random.randint(0, 2, 128).tolist()))
+        sample_hash = hash_to_bytes(np.random.randint(0, 2, 128))
         user = User(username='demo_user', email='demo@example.com',
-                   multimodal_hash=sample_hash, is_active=True)
+                   hash_template=sample_hash, is_active=True)
         user.set_password('demo123')
         db.session.add(user)
+        bump_gallery_version()
         db.session.commit()
         print("✅ Sample user created:")
         print(f"   Username: demo_user")
@@ -29,9 +32,87 @@ def reset_database():
         db.create_all()
         print("✅ Recreated all tables")
 
+def ensure_column(name):
+    columns = {c['name'] for c in db.inspect(db.engine).get_columns(User.__tablename__)}
+    if name in columns:
+        return
+    dialect = db.engine.dialect
+    table = dialect.identifier_preparer.quote(User.__tablename__)
+    column_type = User.__table__.c[name].type.compile(dialect=dialect)
+    with db.engine.begin() as conn:
+        conn.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}'))
+    print(f"✅ Added user.{name} column")
+
+def ensure_gallery_state():
+    """Create the gallery_state table on databases that predate it."""
+    GalleryState.__table__.create(db.engine, checkfirst=True)
+
+def migrate_hash_templates(batch_size=500, pause=0.05):
+    """
+    Convert legacy comma-separated multimodal_hash strings into 16-byte
+    hash_template blobs. Rows are walked in primary-key order and every
+    batch is its own short transaction, so the table is never locked for
+    long and the command can be interrupted and re-run at any time. The
+    legacy strings are kept, so a backend that still reads them keeps
+    working; clear them with clear_legacy_hashes once it is retired.
+    """
+    with app.app_context():
+        ensure_column('hash_template')
+        ensure_column('fp_hash_template')
+        ensure_gallery_state()
+        last_id, converted = 0, 0
+        while True:
+            rows = (db.session.query(User.id, User.multimodal_hash)
+                    .filter(User.id > last_id, User.hash_template.is_(None),
+                            User.multimodal_hash.isnot(None), User.multimodal_hash != '')
+                    .order_by(User.id).limit(batch_size).all())
+            if not rows:
+                break
+            db.session.execute(db.update(User), [
+                {'id': r.id, 'hash_template': hash_to_bytes(string_to_hash(r.multimodal_hash))}
+                for r in rows])
+            db.session.commit()
+            last_id = rows[-1].id
+            converted += len(rows)
+            print(f"   converted {converted} users (up to id {last_id})")
+            time.sleep(pause)
+        bump_gallery_version(rebuild=True)
+        db.session.commit()
+        print(f"✅ Migrated {converted} biometric hashes to packed templates")
+
+def clear_legacy_hashes(batch_size=500, pause=0.05):
+    """
+    Drop the legacy multimodal_hash strings of users that already have a
+    hash_template, in short batches like migrate. Run it only once no
+    backend reading multimodal_hash is left, since there is no way back.
+    """
+    with app.app_context():
+        last_id, cleared = 0, 0
+        while True:
+            ids = [r.id for r in db.session.query(User.id)
+                   .filter(User.id > last_id, User.hash_template.isnot(None), User.multimodal_hash.isnot(None))
+                   .order_by(User.id).limit(batch_size).all()]
+            if not ids:
+                break
+            db.session.execute(db.update(User), [{'id': user_id, 'multimodal_hash': None} for user_id in ids])
+            db.session.commit()
+            last_id = ids[-1]
+            cleared += len(ids)
+            print(f"   cleared {cleared} users (up to id {last_id})")
+            time.sleep(pause)
+        print(f"✅ Cleared {cleared} legacy biometric hashes")
+
+def refresh_gallery():
+    """Make every worker reload its gallery, e.g. after deactivating users directly in the database."""
+    with app.app_context():
+        ensure_gallery_state()
+        bump_gallery_version(rebuild=True)
+        db.session.commit()
+        print("✅ Gallery version bumped; workers reload on their next identification")
+
 if __name__ == '__main__':
     if len(sys.argv) < 2:
-        print("Usage: python db_init.py [init|sample|reset]")
+        print("Usage: python db_init.py [init|sample|reset|migrate [batch_size]|clear-legacy-hashes [batch_size]|refresh-gallery]")
         sys.exit(1)
     command = sys.argv[1]
     if command == 'init':
@@ -42,5 +123,11 @@ if __name__ == '__main__':
         confirm = input("⚠️  Delete ALL data? Type 'yes': ")
         if confirm.lower() == 'yes':
             reset_database()
+    elif command == 'migrate':
+        migrate_hash_templates(batch_size=int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+    elif command == 'clear-legacy-hashes':
+        clear_legacy_hashes(batch_size=int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+    elif command == 'refresh-gallery':
+        refresh_gallery()
     else:
         print(f"❌ Unknown command: {command}")
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Shared thread pool for decoding request images.
+
+A biometric request carries two images. Pillow releases the GIL while it
+decodes and resizes, so decoding the face and the fingerprint on pool
+threads overlaps the two instead of running them back to back on the
+request thread. The pool is bounded and shared by all request threads of a
+worker. Queue wait and run time are recorded so saturation shows up in
+metrics.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class DecodePool:
+    def __init__(self, max_workers=4, name='decode'):
+        """max_workers=0 runs every task inline on the calling thread."""
+        self.max_workers = max_workers
+        self.name = name
+        self._executor = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'tasks': 0, 'errors': 0, 'queue_wait_ms_total': 0.0, 'queue_wait_ms_max': 0.0,
+                       'run_ms_total': 0.0}
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so a pool created in a preloaded
+        # gunicorn master is recreated in each worker.
+        if self._pid == os.getpid():
+            return self._executor
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+                self._pid = os.getpid()
+        return self._executor
+
+    def _timed(self, fn, args, queued):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception:
+            with self._stats_lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            finished = time.perf_counter()
+            with self._stats_lock:
+                wait_ms = (started - queued) * 1000.0
+                self._stats['tasks'] += 1
+                self._stats['queue_wait_ms_total'] += wait_ms
+                self._stats['queue_wait_ms_max'] = max(self._stats['queue_wait_ms_max'], wait_ms)
+                self._stats['run_ms_total'] += (finished - started) * 1000.0
+
+    def run(self, calls):
+        """
+        Run (fn, *args) calls concurrently and return their results in order.
+        Every call finishes before the first exception, if any, is re-raised.
+        """
+        if self.max_workers <= 0 or len(calls) == 1:
+            return [self._timed(fn, args, time.perf_counter()) for fn, *args in calls]
+        executor = self._ensure_started()
+        futures = [executor.submit(self._timed, fn, args, time.perf_counter()) for fn, *args in calls]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        tasks = stats['tasks']
+        return {
+            'max_workers': self.max_workers,
+            'tasks': tasks,
+            'errors': stats['errors'],
+            'avg_queue_wait_ms': stats['queue_wait_ms_total'] / tasks if tasks else 0.0,
+            'max_queue_wait_ms': stats['queue_wait_ms_max'],
+            'avg_run_ms': stats['run_ms_total'] / tasks if tasks else 0.0,
+        }
@@ -0,0 +1,148 @@
+"""
+Build deployable artifacts for MultimodalHashNet.
+
+Usage:
+    python export_model.py bundle OUT [--checkpoint STATE_DICT] [--seed N] [--fp-hash-bits N]
+    python export_model.py torchscript OUT --weights BUNDLE
+    python export_model.py check-torchscript ARTIFACT --weights BUNDLE
+    python export_model.py onnx OUT --weights BUNDLE
+    python export_model.py check-onnx ARTIFACT --weights BUNDLE
+    python export_model.py check-folded --weights BUNDLE
+
+bundle             Write a weight bundle for MODEL_WEIGHTS_PATH. Without
+                   --checkpoint the ImageNet-pretrained backbones are
+                   downloaded once (run this on a connected machine and copy
+                   the file to air-gapped nodes). --fp-hash-bits adds the
+                   fingerprint code head used by cascade identification;
+                   it is seeded when the checkpoint does not include one.
+torchscript        Trace and freeze the inference path into a
+                   TorchScript artifact for MODEL_TORCHSCRIPT_PATH. The
+                   artifact is parity-checked before the command succeeds.
+check-torchscript  Compare an artifact bit-for-bit against the eager model on
+                   a fixed set of inputs; exits non-zero on any mismatch.
+onnx               Export the inference path to ONNX (dynamic batch axis) for
+                   INFERENCE_BACKEND=onnx / MODEL_ONNX_PATH, then run the same
+                   bit-exactness check through ONNX Runtime.
+check-onnx         Bit-exactness check of an ONNX artifact against PyTorch.
+check-folded       Bit-exactness check of the BatchNorm-folded eager module
+                   (prepare_for_inference) against the original model.
+"""
+
+import argparse
+import sys
+import time
+
+import torch
+
+from inference_backends import OnnxBackend, TorchBackend
+from model import (HashEncoder, MultimodalHashNet, export_onnx, export_torchscript, load_bundle,
+                   load_torchscript, parity_inputs, prepare_for_inference, save_bundle)
+
+
+def bit_mismatches(reference, candidate, count=32):
+    """Number of differing hash bits between two backends on the fixed parity inputs."""
+    face, fp = (t.numpy() for t in parity_inputs(count=count))
+    return int((reference.hash_batch(face, fp) != candidate.hash_batch(face, fp)).sum())
+
+
+def eager_backend(weights):
+    return TorchBackend(HashEncoder(load_bundle(weights)).eval(), 'eager')
+
+
+def report_parity(reference, candidate, label):
+    mismatches = bit_mismatches(reference, candidate)
+    if mismatches:
+        print(f"❌ {label}: {mismatches} hash bits differ from the eager model")
+        sys.exit(1)
+    print(f"✅ {label}: identical hash bits on the parity inputs")
+
+
+def export_bundle(args):
+    if args.fp_hash_bits % 64:
+        print(f"❌ --fp-hash-bits must be a multiple of 64, got {args.fp_hash_bits}")
+        sys.exit(1)
+    torch.manual_seed(args.seed)
+    if args.checkpoint:
+        model = MultimodalHashNet(pretrained=False, fp_hash_bits=args.fp_hash_bits)
+        state = torch.load(args.checkpoint, map_location='cpu', weights_only=True)
+        missing, unexpected = model.load_state_dict(state.get('state_dict', state), strict=False)
+        if unexpected or any(not key.startswith('fp_hash_layer.') for key in missing):
+            raise RuntimeError(f'Checkpoint does not match the model: missing {missing}, unexpected {unexpected}')
+    else:
+        model = MultimodalHashNet(pretrained=True, fp_hash_bits=args.fp_hash_bits)
+    save_bundle(model.eval(), args.output)
+    start = time.perf_counter()
+    load_bundle(args.output)
+    print(f"✅ Wrote {args.output} (reloads in {(time.perf_counter() - start) * 1000:.0f} ms)")
+
+
+def export_torchscript_artifact(args):
+    export_torchscript(load_bundle(args.weights), args.output)
+    print(f"✅ Wrote {args.output}")
+    args.artifact = args.output
+    check_torchscript(args)
+
+
+def check_torchscript(args):
+    report_parity(eager_backend(args.weights),
+                  TorchBackend(load_torchscript(args.artifact), 'torchscript'), 'TorchScript parity')
+
+
+def export_onnx_artifact(args):
+    export_onnx(load_bundle(args.weights), args.output)
+    print(f"✅ Wrote {args.output}")
+    args.artifact = args.output
+    check_onnx(args)
+
+
+def check_onnx(args):
+    report_parity(eager_backend(args.weights), OnnxBackend(args.artifact), 'ONNX Runtime parity')
+
+
+def check_folded(args):
+    folded = prepare_for_inference(load_bundle(args.weights))
+    report_parity(eager_backend(args.weights), TorchBackend(folded, 'eager-folded'), 'BatchNorm folding parity')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build deployable MultimodalHashNet artifacts')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    bundle = commands.add_parser('bundle', help='write an offline weight bundle')
+    bundle.add_argument('output')
+    bundle.add_argument('--checkpoint', help='trained state_dict to bundle instead of ImageNet backbones')
+    bundle.add_argument('--seed', type=int, default=0, help='seed for layers not covered by the weights')
+    bundle.add_argument('--fp-hash-bits', type=int, default=0,
+                        help='bits of the fingerprint code head for cascade identification (0 = none)')
+    bundle.set_defaults(func=export_bundle)
+
+    script = commands.add_parser('torchscript', help='export a frozen TorchScript artifact')
+    script.add_argument('output')
+    script.add_argument('--weights', required=True, help='weight bundle to export')
+    script.set_defaults(func=export_torchscript_artifact)
+
+    check = commands.add_parser('check-torchscript', help='bit-exactness check of a TorchScript artifact')
+    check.add_argument('artifact')
+    check.add_argument('--weights', required=True, help='weight bundle the artifact was exported from')
+    check.set_defaults(func=check_torchscript)
+
+    onnx = commands.add_parser('onnx', help='export an ONNX model for ONNX Runtime')
+    onnx.add_argument('output')
+    onnx.add_argument('--weights', required=True, help='weight bundle to export')
+    onnx.set_defaults(func=export_onnx_artifact)
+
+    check_onnx_cmd = commands.add_parser('check-onnx', help='bit-exactness check of an ONNX artifact')
+    check_onnx_cmd.add_argument('artifact')
+    check_onnx_cmd.add_argument('--weights', required=True, help='weight bundle the artifact was exported from')
+    check_onnx_cmd.set_defaults(func=check_onnx)
+
+    folded = commands.add_parser('check-folded', help='bit-exactness check of the BatchNorm-folded model')
+    folded.add_argument('--weights', required=True, help='weight bundle to fold')
+    folded.set_defaults(func=check_folded)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+In-memory gallery of enrolled multimodal hashes for 1:N identification.
+
+Every active user's 128-bit code is packed into two uint64 words and kept in
+one contiguous array next to a parallel array of user ids, so a probe is
+matched against the whole gallery with a single XOR + popcount.
+
+Two engines share the same query API:
+
+- ``linear``: exhaustive vectorized scan, O(N) per probe.
+- ``mih``: multi-index hashing (Norouzi et al.). The code is split into m
+  disjoint substrings with an exact-match table per substring; by the
+  pigeonhole principle any code within radius r of the probe matches it in
+  at least one substring within radius r // m, so only those buckets are
+  verified.
+"""
+
+import itertools
+import threading
+
+import numpy as np
+
+HASH_BITS = 128
+HASH_WORDS = HASH_BITS // 64
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(words):
+        return np.bitwise_count(words)
+else:
+    _POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(words):
+        counts = _POPCOUNT8[words.view(np.uint8)]
+        return counts.reshape(words.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def pack_hash(hash_array, hash_bits=HASH_BITS):
+    """Pack a 0/1 hash (or an (N, hash_bits) matrix of hashes) into uint64 words."""
+    bits = np.asarray(hash_array) > 0
+    if bits.shape[-1] != hash_bits:
+        raise ValueError(f'Expected {hash_bits}-bit hashes, got {bits.shape[-1]}')
+    packed = np.ascontiguousarray(np.packbits(bits, axis=-1))
+    return packed.view('>u8').astype(np.uint64)
+
+
+def unpack_hash(words):
+    """Inverse of pack_hash; returns float 0/1 vectors like generate_hash."""
+    packed = np.ascontiguousarray(np.asarray(words, dtype=np.uint64).astype('>u8'))
+    bits = np.unpackbits(packed.view(np.uint8), axis=-1)
+    return bits.astype(np.float32)
+
+
+def hash_to_bytes(hash_array):
+    """Serialize a 0/1 hash into its 16-byte bit-packed template."""
+    return np.packbits(np.asarray(hash_array) > 0).tobytes()
+
+
+def bytes_to_hash(template):
+    """Decode a 16-byte template back into a float 0/1 vector."""
+    return np.unpackbits(np.frombuffer(template, dtype=np.uint8)).astype(np.float32)
+
+
+def bytes_to_words(templates, hash_bits=HASH_BITS):
+    """Decode a sequence of templates straight into packed (N, hash_bits / 64) uint64 words."""
+    words = np.frombuffer(b''.join(templates), dtype='>u8')
+    return words.reshape(-1, hash_bits // 64).astype(np.uint64)
+
+
+def hamming_distances(codes, probe):
+    """Hamming distance from one packed probe to every packed code."""
+    return popcount(codes ^ probe).sum(axis=-1, dtype=np.int32)
+
+
+def hamming_distance_matrix(codes, probes, chunk_rows=65536):
+    """(P, N) Hamming distances between P packed probes and N packed codes."""
+    distances = np.empty((len(probes), len(codes)), dtype=np.int32)
+    # Chunk the gallery so the (P, chunk, 2) XOR intermediate stays small.
+    for start in range(0, len(codes), chunk_rows):
+        chunk = codes[start:start + chunk_rows]
+        distances[:, start:start + len(chunk)] = popcount(
+            chunk[None, :, :] ^ probes[:, None, :]).sum(axis=-1, dtype=np.int32)
+    return distances
+
+
+class GalleryIndex:
+    """Packed-bit gallery answering nearest-match queries with a linear scan."""
+
+    engine = 'linear'
+
+    def __init__(self, hash_bits=HASH_BITS):
+        if hash_bits % 64:
+            raise ValueError('hash_bits must be a multiple of 64')
+        self.hash_bits = hash_bits
+        self.hash_words = hash_bits // 64
+        self._lock = threading.Lock()
+        self._snapshot = (np.empty((0, self.hash_words), dtype=np.uint64),
+                          np.empty(0, dtype=np.int64))
+
+    def __len__(self):
+        return len(self._snapshot[1])
+
+    def build(self, user_ids, hashes, packed=False):
+        """
+        Replace the gallery contents with the given ids and 0/1 hashes
+        (or (N, hash_bits / 64) uint64 words from pack_hash when packed=True).
+        """
+        codes, ids = self._prepare(user_ids, hashes, packed)
+        # The new contents do not depend on the old ones, so the snapshot is
+        # built before taking the lock and only swapped in under it.
+        snapshot = self._make_snapshot(np.ascontiguousarray(codes), ids)
+        with self._lock:
+            self._snapshot = snapshot
+
+    def add(self, user_ids, hashes, packed=False):
+        """Append entries, replacing any existing entries for the same ids."""
+        codes, ids = self._prepare(user_ids, hashes, packed)
+        if not len(ids):
+            return
+        with self._lock:
+            old_codes, old_ids = self._snapshot[:2]
+            keep = ~np.isin(old_ids, ids)
+            if keep.all():
+                self._snapshot = self._append_snapshot(self._snapshot, np.ascontiguousarray(codes), ids)
+                return
+            self._publish(np.concatenate([old_codes[keep], codes]),
+                          np.concatenate([old_ids[keep], ids]))
+
+    def remove(self, user_ids):
+        with self._lock:
+            old_codes, old_ids = self._snapshot[:2]
+            keep = ~np.isin(old_ids, np.asarray(user_ids, dtype=np.int64))
+            self._publish(old_codes[keep], old_ids[keep])
+
+    def nearest(self, hash_array, max_distance=None):
+        """
+        Return (user_id, distance) of the closest enrolled hash, or
+        (None, None) when the gallery is empty.
+
+        max_distance is a hint for engines that can prune their search; such
+        engines return the closest hash they examined, which may lie beyond
+        it, and (None, None) only when their search examined no hash at all.
+        """
+        codes, ids = self._snapshot[:2]
+        if not len(ids):
+            return None, None
+        distances = hamming_distances(codes, pack_hash(hash_array, self.hash_bits))
+        best = int(np.argmin(distances))
+        return int(ids[best]), int(distances[best])
+
+    def distances_to(self, hash_array, user_ids):
+        """(ids, distances) from one probe to the given users; ids not in the gallery are left out."""
+        codes, ids = self._snapshot[:2]
+        rows = np.flatnonzero(np.isin(ids, np.asarray(user_ids, dtype=np.int64)))
+        return ids[rows], hamming_distances(codes[rows], pack_hash(hash_array, self.hash_bits))
+
+    def user_ids(self):
+        return self._snapshot[1]
+
+    def top_k(self, hash_arrays, k=1):
+        """
+        Match a batch of probes at once. Returns, per probe, a list of up to k
+        (user_id, distance) pairs ordered by increasing distance.
+        """
+        codes, ids = self._snapshot[:2]
+        probes = pack_hash(np.asarray(hash_arrays).reshape(-1, self.hash_bits), self.hash_bits)
+        if not len(ids):
+            return [[] for _ in range(len(probes))]
+        distances = hamming_distance_matrix(codes, probes)
+        k = min(k, len(ids))
+        if k < len(ids):
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            nearest = np.broadcast_to(np.arange(len(ids)), distances.shape)
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        ranked = np.argsort(nearest_distances, axis=1, kind='stable')
+        nearest = np.take_along_axis(nearest, ranked, axis=1)
+        nearest_distances = np.take_along_axis(nearest_distances, ranked, axis=1)
+        return [[(int(ids[i]), int(d)) for i, d in zip(rows, dists)]
+                for rows, dists in zip(nearest, nearest_distances)]
+
+    def _prepare(self, user_ids, hashes, packed=False):
+        ids = np.asarray(user_ids, dtype=np.int64).reshape(-1)
+        if not len(ids):
+            return np.empty((0, self.hash_words), dtype=np.uint64), ids
+        if packed:
+            codes = np.asarray(hashes, dtype=np.uint64).reshape(len(ids), self.hash_words)
+        else:
+            codes = pack_hash(np.asarray(hashes).reshape(len(ids), -1), self.hash_bits)
+        return codes, ids
+
+    def _publish(self, codes, ids):
+        # Readers take the snapshot tuple without locking, so everything a
+        # query needs is swapped in together and never mutated afterwards.
+        self._snapshot = self._make_snapshot(np.ascontiguousarray(codes), ids)
+
+    def _make_snapshot(self, codes, ids):
+        return codes, ids
+
+    def _append_snapshot(self, snapshot, codes, ids):
+        """A new snapshot holding snapshot's rows followed by new, unseen ids."""
+        return self._make_snapshot(np.concatenate([snapshot[0], codes]), np.concatenate([snapshot[1], ids]))
+
+
+class MultiIndexHashIndex(GalleryIndex):
+    """
+    Multi-index hashing engine for radius-bounded nearest-match queries.
+
+    Each of the num_tables substring tables is stored in CSR form: row
+    positions sorted by substring value plus an offsets array indexed by
+    substring value, so a bucket lookup is two array reads. Queries whose
+    per-substring radius exceeds max_substring_radius would enumerate too
+    many buckets and fall back to the linear scan.
+    """
+
+    engine = 'mih'
+
+    def __init__(self, num_tables=8, radius=15, max_substring_radius=2, hash_bits=HASH_BITS):
+        if hash_bits % num_tables or 64 % (hash_bits // num_tables):
+            raise ValueError(f'num_tables must split {hash_bits} bits into substrings dividing 64')
+        self.num_tables = num_tables
+        self.substring_bits = hash_bits // num_tables
+        if self.substring_bits > 16:
+            raise ValueError('Substrings wider than 16 bits are not supported; use more tables')
+        self.radius = radius
+        self.max_substring_radius = max_substring_radius
+        self._masks = {}
+        super().__init__(hash_bits)
+
+    def nearest(self, hash_array, max_distance=None):
+        radius = self.radius if max_distance is None else int(max_distance)
+        sub_radius = radius // self.num_tables
+        if sub_radius > self.max_substring_radius:
+            return super().nearest(hash_array)
+        codes, ids, offsets, order = self._snapshot
+        if not len(ids):
+            return None, None
+        probe = pack_hash(hash_array, self.hash_bits)
+        tables = np.arange(self.num_tables)
+        probe_keys = np.array([self._substring(probe[None, :], t)[0] for t in tables], dtype=np.int64)
+        keys = probe_keys[:, None] ^ self._flip_masks(sub_radius)[None, :]
+        starts = offsets[tables[:, None], keys].ravel()
+        lengths = offsets[tables[:, None], keys + 1].ravel() - starts
+        nonempty = lengths > 0
+        starts, lengths = starts[nonempty], lengths[nonempty]
+        if not len(lengths):
+            return None, None
+        # Concatenate every bucket's slice of order in one vectorized gather.
+        out_starts = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - out_starts, lengths) + np.arange(int(lengths.sum()))
+        candidates = np.unique(order[positions])
+        distances = hamming_distances(codes[candidates], probe)
+        best = int(np.argmin(distances))
+        return int(ids[candidates[best]]), int(distances[best])
+
+    def _substring(self, codes, table):
+        per_word = 64 // self.substring_bits
+        word, slot = divmod(table, per_word)
+        shift = np.uint64((per_word - 1 - slot) * self.substring_bits)
+        return (codes[:, word] >> shift) & np.uint64((1 << self.substring_bits) - 1)
+
+    def _flip_masks(self, sub_radius):
+        if sub_radius not in self._masks:
+            masks = [0]
+            for weight in range(1, sub_radius + 1):
+                for bits in itertools.combinations(range(self.substring_bits), weight):
+                    masks.append(sum(1 << b for b in bits))
+            self._masks[sub_radius] = np.array(masks, dtype=np.int64)
+        return self._masks[sub_radius]
+
+    def _make_snapshot(self, codes, ids):
+        buckets = 1 << self.substring_bits
+        count = len(ids)
+        # order holds, per table, row numbers sorted by substring value;
+        # offsets[t, key] is where bucket key of table t starts in the
+        # flattened order array.
+        order = np.empty((self.num_tables, count), dtype=np.uint32 if count < 2 ** 32 else np.int64)
+        offsets = np.zeros((self.num_tables, buckets + 1), dtype=np.int64)
+        for table in range(self.num_tables):
+            keys = self._substring(codes, table).astype(np.int64)
+            order[table] = np.argsort(keys, kind='stable')
+            offsets[table, 1:] = np.cumsum(np.bincount(keys, minlength=buckets))
+            offsets[table] += table * count
+        return codes, ids, offsets, order.ravel()
+
+    def _append_snapshot(self, snapshot, codes, ids):
+        # Registrations arrive one at a time, so instead of re-sorting every
+        # table the new rows are inserted at the end of their buckets. This
+        # is a copy per table rather than a sort, and gives the same tables
+        # as _make_snapshot because a stable sort keeps rows in order within
+        # a bucket and the new rows come last.
+        old_codes, old_ids, old_offsets, old_order = snapshot
+        count, total = len(old_ids), len(old_ids) + len(ids)
+        if total >= 2 ** 32:
+            return super()._append_snapshot(snapshot, codes, ids)
+        buckets = 1 << self.substring_bits
+        old_order = old_order.reshape(self.num_tables, count)
+        rows = np.arange(count, total)
+        order = np.empty((self.num_tables, total), dtype=np.uint32)
+        offsets = np.empty_like(old_offsets)
+        for table in range(self.num_tables):
+            keys = self._substring(codes, table).astype(np.int64)
+            by_key = np.argsort(keys, kind='stable')
+            starts = old_offsets[table] - table * count
+            order[table] = np.insert(old_order[table], starts[keys[by_key] + 1], rows[by_key])
+            offsets[table, 0] = 0
+            offsets[table, 1:] = starts[1:] + np.cumsum(np.bincount(keys, minlength=buckets))
+            offsets[table] += table * total
+        return (np.concatenate([old_codes, codes]), np.concatenate([old_ids, ids]), offsets, order.ravel())
+
+
+INDEX_ENGINES = {
+    GalleryIndex.engine: GalleryIndex,
+    MultiIndexHashIndex.engine: MultiIndexHashIndex,
+}
+
+
+def create_index(engine='linear', **options):
+    """Instantiate a gallery index engine by name ('linear' or 'mih')."""
+    try:
+        return INDEX_ENGINES[engine](**options)
+    except KeyError:
+        raise ValueError(f"Unknown gallery index engine '{engine}'") from None
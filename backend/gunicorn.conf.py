@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for the biometric API.
+
+With GUNICORN_PRELOAD=1 (the default) App is imported once in the master:
+the model is built there, autograd is switched off on its weights and the
+heap is frozen out of the cyclic GC before forking, so workers share one
+copy-on-write copy of the weights instead of each building their own. Per-worker work
+(database pool reset, warm-up) runs in post_fork, and worker_exit writes
+out queued authentication log records before a worker goes away.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# App sizes its inference thread budget from the worker layout.
+os.environ['GUNICORN_WORKERS'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(threads)
+if preload_app:
+    os.environ['MODEL_PRELOAD'] = '1'
+
+
+def pre_fork(server, worker):
+    # Objects in the permanent generation are never visited by the collector,
+    # so the workers do not dirty (and copy) the pages holding them.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from App import on_worker_start
+        on_worker_start()
+
+
+def worker_exit(server, worker):
+    from App import on_worker_exit
+    on_worker_exit()
@@ -0,0 +1,77 @@
+"""
+Content-addressed cache of biometric hashes.
+
+Clients retry on timeouts and the front end often submits the same capture
+to /api/login and then /api/verify, so identical face/fingerprint pairs are
+hashed repeatedly. Entries are keyed by a BLAKE2b digest of both decoded
+and resized model-input arrays (with their shapes, so different inputs
+cannot collide by layout). Entries are evicted least-recently-used beyond
+max_entries, or once older than ttl_seconds.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def array_pair_digest(face_u8, fp_u8):
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (face_u8, fp_u8):
+        digest.update(f'{array.dtype}{array.shape}:'.encode())
+        digest.update(array.tobytes())
+    return digest.digest()
+
+
+class HashCache:
+    def __init__(self, max_entries=1024, ttl_seconds=300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+
+    def get(self, key):
+        """The cached value for key, or None when missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        return {
+            'enabled': True,
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            **stats,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,92 @@
+"""
+Header-only admission control for uploaded images.
+
+Everything here runs before any pixel is decoded: the encoded byte length,
+then the format and dimensions from the image header. JPEGs are checked
+at the size they will actually be decoded at. That is after DCT downscaling
+(see preprocessing.load_image), so a 50 MP photo is admitted and
+downsampled for free, while a 50 MP PNG, which would have to be decoded in
+full, is rejected. Rejections raise ImageRejectedError with a 4xx status
+and are counted per reason.
+"""
+
+import threading
+
+from PIL import Image, UnidentifiedImageError
+
+from preprocessing import load_image
+
+DEFAULT_FORMATS = ('JPEG', 'PNG', 'WEBP', 'BMP')
+
+
+class RequestRejectedError(ValueError):
+    """Unusable client input; status is the HTTP status to answer with, reason a stable code."""
+
+    def __init__(self, reason, message, status=400):
+        super().__init__(message)
+        self.reason = reason
+        self.status = status
+
+
+class ImageRejectedError(RequestRejectedError):
+    """An upload refused before decoding."""
+
+
+class ImageAdmission:
+    def __init__(self, max_bytes=10 * 1024 * 1024, max_pixels=24_000_000, min_side=32,
+                 formats=DEFAULT_FORMATS):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.min_side = min_side
+        self.formats = tuple(f.upper() for f in formats)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._rejected = {}
+
+    def record_rejection(self, reason):
+        with self._lock:
+            self._rejected[reason] = self._rejected.get(reason, 0) + 1
+
+    def reject(self, reason, message, status=400):
+        self.record_rejection(reason)
+        raise ImageRejectedError(reason, message, status)
+
+    def check_size(self, nbytes):
+        if nbytes > self.max_bytes:
+            self.reject('too_many_bytes', f'Image is {nbytes} bytes, the limit is {self.max_bytes}', 413)
+
+    def check_header(self, img):
+        if img.format not in self.formats:
+            self.reject('unsupported_format', f'Unsupported image format {img.format}, '
+                        f"expected one of {', '.join(self.formats)}", 415)
+        width, height = img.size
+        if min(width, height) < self.min_side:
+            self.reject('too_small', f'Image is {width}x{height}, sides must be at least {self.min_side} px')
+        if width * height > self.max_pixels:
+            self.reject('too_many_pixels', f'Image would decode to {width}x{height}, '
+                        f'the limit is {self.max_pixels} pixels', 413)
+
+    def open(self, fp, nbytes, draft=True):
+        """Admit and open an encoded image of nbytes bytes; nothing is decoded before the checks pass."""
+        self.check_size(nbytes)
+        try:
+            img = load_image(fp, draft=draft, admit=self.check_header)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+            self.reject('malformed', 'Image data could not be read')
+        with self._lock:
+            self._admitted += 1
+        return img
+
+    def metrics(self):
+        with self._lock:
+            rejected = dict(self._rejected)
+            admitted = self._admitted
+        return {
+            'admitted': admitted,
+            'rejected': sum(rejected.values()),
+            'rejected_by_reason': rejected,
+            'max_bytes': self.max_bytes,
+            'max_pixels': self.max_pixels,
+            'min_side': self.min_side,
+            'formats': list(self.formats),
+        }
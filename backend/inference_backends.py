@@ -0,0 +1,333 @@
+"""
+Pluggable inference backends behind generate_hash.
+
+Every backend takes preprocessed float32 NCHW batches as NumPy arrays and
+returns a (batch, 128) float32 array of 0/1 hash bits. torch is only
+imported by the PyTorch backends. With the 'onnx' or 'remote' backend the
+API imports neither torch nor torchvision (preprocessing is NumPy only), so
+those workers run without them installed.
+
+The eager backend also accepts an inference profile: 'channels_last' runs
+the model and inputs in torch.channels_last, 'bf16' additionally wraps the
+forward pass in CPU autocast with bfloat16. Profiles the hardware cannot run
+efficiently fall back automatically (bf16 -> channels_last -> default).
+
+The 'remote' backend runs nothing locally: it forwards batches to an
+inference_server.py process over a Unix socket.
+
+Backends that can run the face tower on its own (split_towers) compute
+face features ahead of the fingerprint with face_feature_batch and finish
+the hash later with hash_from_face_features; only the eager HashEncoder
+can, since the exported artifacts contain a single fused graph.
+
+Backends serving a model with a fingerprint code head (fp_hash_bits > 0)
+also code fingerprint-only batches with fp_code_batch, which returns the
+fingerprint tower's features too, so hash_from_fp_features can finish the
+fused hash without running that tower again; fp_hash_bits is 0 on every
+other backend.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+
+from inference_scheduler import SchedulerBusyError
+from inference_server import (HASH_BYTES, OP_INFO, STATUS_BUSY, STATUS_OK, encode_hash_request,
+                              recv_frame, send_frame)
+
+BACKENDS = ('auto', 'eager', 'torchscript', 'onnx', 'quantized', 'remote')
+PROFILES = ('default', 'channels_last', 'bf16')
+
+
+def bf16_supported():
+    """True when oneDNN has native bfloat16 kernels on this CPU (AVX512-BF16 / AMX)."""
+    import torch
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def resolve_profile(requested):
+    """The profile actually usable on this host for a requested one."""
+    import torch
+    if requested not in PROFILES:
+        raise ValueError(f"Unknown inference profile '{requested}', expected one of {', '.join(PROFILES)}")
+    if requested == 'bf16' and not bf16_supported():
+        requested = 'channels_last'
+    if requested == 'channels_last' and not torch.backends.mkldnn.is_available():
+        requested = 'default'
+    return requested
+
+
+class InferenceBackend:
+    name = None
+    fp_hash_bits = 0
+    split_towers = False
+
+    def hash_batch(self, face_batch, fp_batch):
+        raise NotImplementedError
+
+    def fp_code_batch(self, fp_batch):
+        """((batch, fp_hash_bits) float32 0/1 fingerprint code bits, (batch, 512) float32 tower features)."""
+        raise NotImplementedError(f'The {self.name} backend has no fingerprint code head')
+
+    def hash_from_fp_features(self, face_batch, fp_features):
+        """Hash bits from a face batch and the matching fp_code_batch features."""
+        raise NotImplementedError(f'The {self.name} backend has no fingerprint code head')
+
+    def face_feature_batch(self, face_batch):
+        """(batch, 2048) float32 face tower features."""
+        raise NotImplementedError(f'The {self.name} backend cannot run the face tower on its own')
+
+    def hash_from_face_features(self, face_features, fp_batch):
+        """Hash bits from face_feature_batch output and the matching fingerprint batch."""
+        raise NotImplementedError(f'The {self.name} backend cannot run the face tower on its own')
+
+    def info(self):
+        return {'backend': self.name}
+
+    def share_memory(self):
+        """Prepare the loaded weights for sharing with forked workers; False if unsupported."""
+        return False
+
+    def wait_ready(self, timeout=60):
+        """Block until the backend can serve requests; local backends always can."""
+        return True
+
+
+class TorchBackend(InferenceBackend):
+    """Eager HashEncoder, or a TorchScript artifact (FP32 or INT8 quantized)."""
+
+    def __init__(self, encoder, name, device='cpu', profile='default', fp_encoder=None):
+        import torch
+        self._torch = torch
+        self.name = name
+        self.device = device
+        self.requested_profile = profile
+        self.profile = resolve_profile(profile) if device == 'cpu' else 'default'
+        self.memory_format = torch.channels_last if self.profile != 'default' else torch.contiguous_format
+        self.encoder = encoder.to(memory_format=self.memory_format) if self.profile != 'default' else encoder
+        self.fp_encoder = fp_encoder
+        self.split_towers = hasattr(encoder, 'from_face_features')
+        if fp_encoder is not None:
+            self.fp_hash_bits = fp_encoder.fp_hash_layer.out_features
+
+    def hash_batch(self, face_batch, fp_batch):
+        torch = self._torch
+        with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.profile == 'bf16'):
+            face = torch.from_numpy(face_batch).to(self.device, memory_format=self.memory_format)
+            fp = torch.from_numpy(fp_batch).to(self.device, memory_format=self.memory_format)
+            return self.encoder(face, fp).float().cpu().numpy()
+
+    def face_feature_batch(self, face_batch):
+        if not self.split_towers:
+            return super().face_feature_batch(face_batch)
+        torch = self._torch
+        with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.profile == 'bf16'):
+            face = torch.from_numpy(face_batch).to(self.device, memory_format=self.memory_format)
+            return self.encoder.face_features(face).float().cpu().numpy()
+
+    def hash_from_face_features(self, face_features, fp_batch):
+        if not self.split_towers:
+            return super().hash_from_face_features(face_features, fp_batch)
+        torch = self._torch
+        with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.profile == 'bf16'):
+            features = torch.from_numpy(face_features).to(self.device)
+            fp = torch.from_numpy(fp_batch).to(self.device, memory_format=self.memory_format)
+            return self.encoder.from_face_features(features, fp).float().cpu().numpy()
+
+    def fp_code_batch(self, fp_batch):
+        if self.fp_encoder is None:
+            return super().fp_code_batch(fp_batch)
+        torch = self._torch
+        with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.profile == 'bf16'):
+            fp = torch.from_numpy(fp_batch).to(self.device, memory_format=self.memory_format)
+            features = self.encoder.fp_features(fp)
+            codes = self.fp_encoder.from_fp_features(features)
+            return codes.float().cpu().numpy(), features.float().cpu().numpy()
+
+    def hash_from_fp_features(self, face_batch, fp_features):
+        if self.fp_encoder is None:
+            return super().hash_from_fp_features(face_batch, fp_features)
+        torch = self._torch
+        with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.profile == 'bf16'):
+            face = torch.from_numpy(face_batch).to(self.device, memory_format=self.memory_format)
+            features = torch.from_numpy(fp_features).to(self.device)
+            return self.encoder.from_features(self.encoder.face_features(face), features).float().cpu().numpy()
+
+    def info(self):
+        return {'backend': self.name, 'profile': self.profile, 'requested_profile': self.requested_profile,
+                'fp_hash_bits': self.fp_hash_bits, 'split_towers': self.split_towers}
+
+    def share_memory(self):
+        # Forked workers share the weights copy-on-write. Large tensors live
+        # in their own mmap'd allocations, so the only writes that could copy
+        # them are autograd's, which is switched off here. share_memory_()
+        # is not used: it would move them to /dev/shm, which containers cap
+        # at 64 MB by default.
+        modules = [self.encoder] + ([self.fp_encoder] if self.fp_encoder is not None else [])
+        for module in modules:
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                tensor.requires_grad_(False)
+        return True
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime CPU session over an artifact from export_model.py onnx."""
+
+    name = 'onnx'
+
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError('INFERENCE_BACKEND=onnx requires the onnxruntime package') from None
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+    def hash_batch(self, face_batch, fp_batch):
+        return self.session.run(['bits'], {
+            'face': np.ascontiguousarray(face_batch, dtype=np.float32),
+            'fingerprint': np.ascontiguousarray(fp_batch, dtype=np.float32),
+        })[0]
+
+    def info(self):
+        return {'backend': self.name, 'artifact': self.path,
+                'intra_op_threads': self.session.get_session_options().intra_op_num_threads}
+
+
+class RemoteBackend(InferenceBackend):
+    """Thin client for inference_server.py; one persistent connection per thread."""
+
+    name = 'remote'
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        # Connections are per thread and per process: a socket inherited
+        # across a gunicorn fork would be shared by parent and child.
+        sock = getattr(self._local, 'sock', None)
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            sock.settimeout(self.timeout)
+            self._local.sock, self._local.pid = sock, os.getpid()
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _call(self, *parts):
+        # One retry on a fresh connection covers a server restart since the
+        # last call; a half-finished exchange is never reused.
+        for attempt in (0, 1):
+            try:
+                sock = self._connection()
+                send_frame(sock, *parts)
+                reply = recv_frame(sock)
+                break
+            except OSError:
+                self._close()
+                if attempt:
+                    raise
+        status, body = reply[0], memoryview(reply)[1:]
+        if status == STATUS_OK:
+            return body
+        if status == STATUS_BUSY:
+            raise SchedulerBusyError(f'Inference server busy: {bytes(body).decode()}')
+        raise RuntimeError(f'Inference server error: {bytes(body).decode()}')
+
+    def hash_batch(self, face_batch, fp_batch):
+        body = self._call(*encode_hash_request(face_batch, fp_batch))
+        packed = np.frombuffer(body, dtype=np.uint8).reshape(-1, HASH_BYTES)
+        return np.unpackbits(packed, axis=1).astype(np.float32)
+
+    def info(self):
+        try:
+            server = json.loads(bytes(self._call(OP_INFO)))
+        except (OSError, RuntimeError) as e:
+            server = {'error': f'{type(e).__name__}: {e}'}
+        return {'backend': self.name, 'socket': self.socket_path, 'server': server}
+
+    def wait_ready(self, timeout=60):
+        """Wait for the server socket to accept connections (it only listens once warm)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._connection()
+                return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f'Inference server at {self.socket_path} not reachable '
+                                       f'after {timeout:.0f}s') from None
+                time.sleep(0.5)
+
+
+def resolve_backend(name, torchscript_path=None):
+    """The backend load_backend builds for name: 'auto' becomes 'torchscript' or 'eager'."""
+    if name == 'auto':
+        return 'torchscript' if torchscript_path and os.path.exists(torchscript_path) else 'eager'
+    return name
+
+
+def load_backend(name='auto', weights_path=None, torchscript_path=None, onnx_path=None, device='cpu',
+                 onnx_threads=0, quantized_path=None, fold_batchnorm=True, profile='default',
+                 socket_path=None):
+    """
+    Build the configured backend. 'auto' keeps the historical behaviour: the
+    TorchScript artifact when one exists, the eager model otherwise. The
+    eager model is served BatchNorm-folded unless fold_batchnorm is False,
+    and with the given inference profile. Only the eager model serves the
+    fingerprint code head; the exported artifacts contain the fused path only.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {', '.join(BACKENDS)}")
+    if name == 'remote':
+        if not socket_path:
+            raise RuntimeError('INFERENCE_BACKEND=remote requires INFERENCE_SOCKET')
+        return RemoteBackend(socket_path)
+
+    if name == 'onnx':
+        if not onnx_path or not os.path.exists(onnx_path):
+            raise RuntimeError('INFERENCE_BACKEND=onnx requires MODEL_ONNX_PATH to point at an exported model')
+        return OnnxBackend(onnx_path, intra_op_threads=onnx_threads)
+
+    if name == 'quantized':
+        if not quantized_path or not os.path.exists(quantized_path):
+            raise RuntimeError('INFERENCE_BACKEND=quantized requires MODEL_QUANTIZED_PATH '
+                               '(see quantize_model.py calibrate)')
+        from quantize_model import load_quantized
+        return TorchBackend(load_quantized(quantized_path, device=device), 'quantized', device)
+
+    from model import FingerprintEncoder, HashEncoder, load_model, load_torchscript, prepare_for_inference
+    if resolve_backend(name, torchscript_path) == 'torchscript':
+        if not torchscript_path or not os.path.exists(torchscript_path):
+            raise RuntimeError('INFERENCE_BACKEND=torchscript requires MODEL_TORCHSCRIPT_PATH')
+        return TorchBackend(load_torchscript(torchscript_path, device=device), 'torchscript', device)
+    model = load_model(weights_path, device=device)
+    if fold_batchnorm:
+        encoder, name = prepare_for_inference(model), 'eager-folded'
+    else:
+        encoder, name = HashEncoder(model).eval(), 'eager'
+    fp_encoder = FingerprintEncoder(model).eval() if model.fp_hash_layer is not None else None
+    return TorchBackend(encoder, name, device, profile=profile, fp_encoder=fp_encoder)
@@ -0,0 +1,126 @@
+"""
+Dynamic micro-batching for model inference.
+
+Request threads submit single items and block on a future; one scheduler
+thread drains the queue, coalescing items that arrive within max_wait_ms of
+the first one (up to max_batch_size) into one call of run_batch, and hands
+each caller its own result.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SchedulerBusyError(RuntimeError):
+    """Raised when the inference queue is full and cannot accept more work."""
+
+
+class InferenceScheduler:
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5.0, max_queue_depth=256,
+                 name='inference-scheduler'):
+        """run_batch takes a list of items and returns a list of results in the same order."""
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_depth = max_queue_depth
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue_depth)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'batches': 0, 'items': 0, 'rejected': 0, 'errors': 0,
+                       'queue_wait_ms_total': 0.0, 'inference_ms_total': 0.0,
+                       'max_queue_depth_seen': 0}
+        self._batch_sizes = {}
+
+    def submit(self, item, timeout=None):
+        """Queue one item and block until its result is ready."""
+        return self.submit_async(item).result(timeout=timeout)
+
+    def submit_async(self, item):
+        """Queue one item and return the Future of its result without waiting."""
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            raise SchedulerBusyError('Inference queue is full') from None
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats['max_queue_depth_seen'] = max(self._stats['max_queue_depth_seen'], depth)
+        return future
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'max_queue_depth': self.max_queue_depth,
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth_seen': stats['max_queue_depth_seen'],
+            'batches': stats['batches'],
+            'items': stats['items'],
+            'rejected': stats['rejected'],
+            'errors': stats['errors'],
+            'avg_batch_size': stats['items'] / stats['batches'] if stats['batches'] else 0.0,
+            'avg_queue_wait_ms': stats['queue_wait_ms_total'] / stats['items'] if stats['items'] else 0.0,
+            'avg_inference_ms': stats['inference_ms_total'] / stats['batches'] if stats['batches'] else 0.0,
+            'batch_size_histogram': batch_sizes,
+        }
+
+    def _ensure_started(self):
+        # Started lazily and per process: threads do not survive a fork, so a
+        # scheduler created before gunicorn forks its workers restarts here.
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue_depth)
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.run_batch([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                with self._stats_lock:
+                    self._stats['errors'] += 1
+                continue
+            finished = time.perf_counter()
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            with self._stats_lock:
+                self._stats['batches'] += 1
+                self._stats['items'] += len(batch)
+                self._stats['queue_wait_ms_total'] += sum(started - queued for _, _, queued in batch) * 1000.0
+                self._stats['inference_ms_total'] += (finished - started) * 1000.0
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
@@ -0,0 +1,201 @@
+"""
+Standalone inference server (sidecar) for MultimodalHashNet.
+
+One process owns the model and serves hash requests from any number of web
+workers over a Unix domain socket, so web concurrency and inference
+concurrency no longer share a GIL or fight over the same thread pool, and
+each can be scaled on its own. Requests from all connections go through one
+InferenceScheduler, so the server batches across web workers.
+
+Wire protocol, one frame per message: a 4-byte big-endian payload length,
+then the payload.
+    request:  op (1 byte) ...
+        b'H' count (uint32 BE), face float32 (count, 3, 112, 112),
+             fp float32 (count, 1, 112, 112), both C-order
+        b'I' nothing; answered with the server info as JSON
+    response: status (1 byte) ...
+        0 OK    hashes bit-packed with np.packbits, 16 bytes each (or JSON for b'I')
+        1 BUSY  message; the queue is full
+        2 ERROR message
+
+Usage: python inference_server.py [--socket PATH] [--backend NAME]
+The model artifacts and batching limits come from the same environment
+variables as App.py; point the API at the server with INFERENCE_BACKEND=remote.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import struct
+import sys
+import time
+
+import numpy as np
+
+from inference_scheduler import InferenceScheduler, SchedulerBusyError
+
+FACE_SHAPE = (3, 112, 112)
+FP_SHAPE = (1, 112, 112)
+HASH_BYTES = 16
+
+OP_HASH = b'H'
+OP_INFO = b'I'
+STATUS_OK = 0
+STATUS_BUSY = 1
+STATUS_ERROR = 2
+
+_LENGTH = struct.Struct('>I')
+
+
+def recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError('Inference socket closed')
+        received += n
+    return buffer
+
+
+def send_frame(sock, *parts):
+    sock.sendall(_LENGTH.pack(sum(len(p) for p in parts)))
+    for part in parts:
+        sock.sendall(part)
+
+
+def recv_frame(sock):
+    return recv_exact(sock, _LENGTH.unpack(recv_exact(sock, _LENGTH.size))[0])
+
+
+def encode_hash_request(face_batch, fp_batch):
+    face = np.ascontiguousarray(face_batch, dtype=np.float32)
+    fp = np.ascontiguousarray(fp_batch, dtype=np.float32)
+    return OP_HASH + _LENGTH.pack(len(face)), memoryview(face).cast('B'), memoryview(fp).cast('B')
+
+
+def decode_hash_request(payload):
+    count = _LENGTH.unpack_from(payload, 1)[0]
+    face_size, fp_size = count * int(np.prod(FACE_SHAPE)), count * int(np.prod(FP_SHAPE))
+    if len(payload) != 1 + _LENGTH.size + (face_size + fp_size) * 4:
+        raise ValueError(f'Malformed hash request for {count} pairs')
+    data = np.frombuffer(payload, dtype=np.float32, offset=1 + _LENGTH.size)
+    return data[:face_size].reshape(count, *FACE_SHAPE), data[face_size:].reshape(count, *FP_SHAPE)
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, socket_path, backend, max_batch_size=8, max_wait_ms=5.0, max_queue_depth=256,
+                 thread_budget=None):
+        self.backend = backend
+        self.thread_budget = thread_budget
+        self.started_at = time.time()
+        # Scheduler items are whole requests; one forward pass covers every
+        # request collected in the window, whichever web worker sent it.
+        self.scheduler = InferenceScheduler(self._run_batch, max_batch_size=max_batch_size,
+                                            max_wait_ms=max_wait_ms, max_queue_depth=max_queue_depth,
+                                            name='inference-server')
+        super().__init__(socket_path, InferenceRequestHandler, bind_and_activate=False)
+
+    def listen(self):
+        """Bind the socket (replacing a stale one) and start accepting connections."""
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.server_bind()
+        self.server_activate()
+
+    def _run_batch(self, requests):
+        if len(requests) == 1:
+            return [self.backend.hash_batch(*requests[0])]
+        bits = self.backend.hash_batch(np.concatenate([face for face, _ in requests]),
+                                       np.concatenate([fp for _, fp in requests]))
+        return np.split(bits, np.cumsum([len(face) for face, _ in requests])[:-1])
+
+    def warm(self, batch_sizes):
+        for batch_size in batch_sizes:
+            self.backend.hash_batch(np.zeros((batch_size, *FACE_SHAPE), dtype=np.float32),
+                                    np.zeros((batch_size, *FP_SHAPE), dtype=np.float32))
+
+    def info(self):
+        return {**self.backend.info(), 'pid': os.getpid(), 'uptime_s': time.time() - self.started_at,
+                'scheduler': self.scheduler.metrics(), 'threads': self.thread_budget}
+
+
+class InferenceRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                payload = recv_frame(self.request)
+            except ConnectionError:
+                return
+            send_frame(self.request, *self.respond(payload))
+
+    def respond(self, payload):
+        op = bytes(payload[:1])
+        try:
+            if op == OP_INFO:
+                return bytes([STATUS_OK]), json.dumps(self.server.info()).encode()
+            if op != OP_HASH:
+                raise ValueError(f'Unknown op {op!r}')
+            bits = self.server.scheduler.submit(decode_hash_request(payload))
+            return bytes([STATUS_OK]), np.packbits(bits.astype(np.uint8), axis=1).tobytes()
+        except SchedulerBusyError as e:
+            return bytes([STATUS_BUSY]), str(e).encode()
+        except Exception as e:
+            return bytes([STATUS_ERROR]), f'{type(e).__name__}: {e}'.encode()
+
+
+def main():
+    from inference_backends import load_backend
+    from thread_budget import apply as apply_thread_budget, compute_budget
+
+    parser = argparse.ArgumentParser(description='Serve MultimodalHashNet hashes over a Unix socket')
+    parser.add_argument('--socket', default=os.environ.get('INFERENCE_SOCKET', '/tmp/hashnet-inference.sock'))
+    parser.add_argument('--backend', help='backend to serve (default: INFERENCE_BACKEND, or auto)')
+    args = parser.parse_args()
+
+    backend_name = args.backend or os.environ.get('INFERENCE_BACKEND', 'auto')
+    if backend_name == 'remote':
+        backend_name = 'auto'
+    max_batch = int(os.environ.get('INFERENCE_MAX_BATCH', 8))
+    # The server is the only process running forward passes, one batch at a time.
+    thread_budget = apply_thread_budget(compute_budget(
+        intra_op_threads=int(os.environ.get('INFERENCE_THREADS', 0)),
+        inter_op_threads=int(os.environ.get('INFERENCE_INTEROP_THREADS', 0))), torch_threads=backend_name != 'onnx')
+    device = 'cpu'
+    if backend_name != 'onnx':
+        import torch
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    backend = load_backend(backend_name,
+                           weights_path=os.environ.get('MODEL_WEIGHTS_PATH'),
+                           torchscript_path=os.environ.get('MODEL_TORCHSCRIPT_PATH'),
+                           onnx_path=os.environ.get('MODEL_ONNX_PATH'), device=device,
+                           onnx_threads=int(os.environ.get('ONNX_INTRA_OP_THREADS', 0))
+                           or thread_budget['intra_op_threads'],
+                           quantized_path=os.environ.get('MODEL_QUANTIZED_PATH'),
+                           fold_batchnorm=os.environ.get('INFERENCE_FOLD_BN', '1') == '1',
+                           profile=os.environ.get('INFERENCE_PROFILE', 'default'))
+    server = InferenceServer(args.socket, backend, max_batch_size=max_batch,
+                             max_wait_ms=float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5)),
+                             max_queue_depth=int(os.environ.get('INFERENCE_QUEUE_DEPTH', 256)),
+                             thread_budget=thread_budget)
+    # Warm up before accepting connections, so a reachable socket means ready.
+    server.warm(range(1, max_batch + 1))
+    server.listen()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"✅ Serving {backend.name} on {args.socket} (pid {os.getpid()})", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+MultimodalHashNet, its inference-only encoder and its artifact formats.
+
+A weight bundle is a single torch.save file holding the model configuration
+and the full inference-ready state_dict. Loading one builds the network on
+the meta device (no ImageNet download, no random initialisation) and
+assigns memory-mapped tensors straight from the file, so startup does not
+touch the network and pages weights in lazily.
+
+A TorchScript artifact is a traced and frozen HashEncoder; it is optimized
+for inference (Conv-BN folding, oneDNN layouts) when loaded, since those
+rewrites are device-specific and do not round-trip through serialization.
+An ONNX artifact exports the same HashEncoder with a dynamic batch axis.
+
+A model may also carry a fingerprint code head (fp_hash_bits > 0): a short
+hash from the ResNet18 features alone, used to shortlist gallery
+candidates before the face tower runs. Until it is trained, the head is a
+seeded random projection, i.e. sign-random-projection LSH over the
+fingerprint embedding, which already preserves its angular neighbourhoods.
+"""
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
+from torchvision.models import resnet50, resnet18
+
+BUNDLE_FORMAT = 'multimodal-hashnet/1'
+
+
+class MarginCosineHead(nn.Module):
+    def __init__(self, feature_dim, num_classes, scale=30.0, margin=0.35):
+        super().__init__()
+        self.scale = scale
+        self.margin = margin
+        self.weight = nn.Parameter(torch.randn(num_classes, feature_dim))
+        nn.init.xavier_uniform_(self.weight)
+
+    def forward(self, embeddings, labels=None):
+        W = F.normalize(self.weight, dim=1)
+        x = F.normalize(embeddings, dim=1)
+        cosine = torch.matmul(x, W.t())
+        if labels is None:
+            return cosine * self.scale
+        one_hot = F.one_hot(labels, num_classes=W.size(0)).float().to(embeddings.device)
+        logits = cosine - one_hot * self.margin
+        return logits * self.scale
+
+
+class MultimodalHashNet(nn.Module):
+    def __init__(self, num_classes=1000, hash_bits=128, pretrained=True, fp_hash_bits=0):
+        super().__init__()
+        self.face_model = resnet50(weights="IMAGENET1K_V2" if pretrained else None)
+        self.face_model.fc = nn.Identity()
+
+        self.fp_model = resnet18(weights="IMAGENET1K_V1" if pretrained else None)
+        old_conv = self.fp_model.conv1
+        self.fp_model.conv1 = nn.Conv2d(1, old_conv.out_channels,
+            kernel_size=old_conv.kernel_size, stride=old_conv.stride,
+            padding=old_conv.padding, bias=False)
+        self.fp_model.fc = nn.Identity()
+
+        self.fusion = nn.Sequential(
+            nn.Linear(2048 + 512, 1024),
+            nn.BatchNorm1d(1024),
+            nn.ReLU(inplace=True)
+        )
+        self.hash_layer = nn.Linear(1024, hash_bits)
+        self.margin_head = MarginCosineHead(hash_bits, num_classes)
+        self.fp_hash_layer = nn.Linear(512, fp_hash_bits) if fp_hash_bits else None
+
+    def forward(self, face, fp, labels=None):
+        f_face = self.face_model(face)
+        f_fp = self.fp_model(fp)
+        fused = torch.cat([f_face, f_fp], dim=1)
+        fused = self.fusion(fused)
+        h = torch.tanh(self.hash_layer(fused))
+        logits = None if labels is None else self.margin_head(h, labels)
+        return h, logits
+
+
+class HashEncoder(nn.Module):
+    """
+    Inference path of MultimodalHashNet: both towers, fusion, hash layer and
+    sign, returning 0/1 bits. tanh is dropped since it does not change the
+    sign, and margin_head is never used at inference.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.face_model = model.face_model
+        self.fp_model = model.fp_model
+        self.fusion = model.fusion
+        self.hash_layer = model.hash_layer
+
+    def face_features(self, face):
+        """The 2048-d face tower output, computable before the fingerprint is available."""
+        return self.face_model(face)
+
+    def fp_features(self, fp):
+        """The 512-d fingerprint tower output."""
+        return self.fp_model(fp)
+
+    def from_features(self, face_features, fp_features):
+        """Fusion and hash layer over both towers' outputs."""
+        fused = self.fusion(torch.cat([face_features, fp_features], dim=1))
+        return (self.hash_layer(fused) > 0).float()
+
+    def from_face_features(self, face_features, fp):
+        """Finish the hash from face_features output: fingerprint tower, fusion and hash layer."""
+        return self.from_features(face_features, self.fp_features(fp))
+
+    def forward(self, face, fp):
+        return self.from_face_features(self.face_features(face), fp)
+
+
+class FingerprintEncoder(nn.Module):
+    """
+    Fingerprint tower and fp_hash_layer of MultimodalHashNet, returning the
+    0/1 bits of the short fingerprint code. Shares its modules with the
+    model, so build it after prepare_for_inference to get the folded tower.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        if model.fp_hash_layer is None:
+            raise ValueError('Model has no fingerprint code head (fp_hash_bits=0)')
+        self.fp_model = model.fp_model
+        self.fp_hash_layer = model.fp_hash_layer
+
+    def from_fp_features(self, fp_features):
+        """Code bits from the fingerprint tower output (HashEncoder.fp_features)."""
+        return (self.fp_hash_layer(fp_features) > 0).float()
+
+    def forward(self, fp):
+        return self.from_fp_features(self.fp_model(fp))
+
+
+def fold_batchnorm(module):
+    """
+    Fold every eval-mode BatchNorm into the Conv2d/Linear that feeds it, in
+    place. Inside nn.Sequential the pair is found by position; elsewhere the
+    torchvision ResNet naming is relied on (convN is always followed by bnN).
+    Folded BatchNorms become nn.Identity.
+    """
+    for child in module.children():
+        fold_batchnorm(child)
+    if isinstance(module, nn.Sequential):
+        layers = list(module)
+        for i in range(len(layers) - 1):
+            if isinstance(layers[i], nn.Conv2d) and isinstance(layers[i + 1], nn.BatchNorm2d):
+                layers[i], layers[i + 1] = fuse_conv_bn_eval(layers[i], layers[i + 1]), nn.Identity()
+            elif isinstance(layers[i], nn.Linear) and isinstance(layers[i + 1], nn.BatchNorm1d):
+                layers[i], layers[i + 1] = fuse_linear_bn_eval(layers[i], layers[i + 1]), nn.Identity()
+        for i, layer in enumerate(layers):
+            module[i] = layer
+        return module
+    for name, child in list(module.named_children()):
+        bn = getattr(module, 'bn' + name[len('conv'):], None) if name.startswith('conv') else None
+        if isinstance(child, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+            setattr(module, name, fuse_conv_bn_eval(child, bn))
+            setattr(module, 'bn' + name[len('conv'):], nn.Identity())
+    return module
+
+
+def prepare_for_inference(model):
+    """
+    Lean inference module for model: a HashEncoder (so margin_head is
+    dropped) with every BatchNorm folded into its preceding Conv2d/Linear
+    and the now-empty slots removed from Sequential containers. model is
+    modified in place and should not be used for anything else afterwards.
+    """
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+    encoder = HashEncoder(fold_batchnorm(model))
+    encoder.fusion = nn.Sequential(*(m for m in encoder.fusion if not isinstance(m, nn.Identity)))
+    return encoder.eval()
+
+
+def parity_inputs(count=8, seed=0):
+    """Fixed (face, fp) batch used to compare artifacts against the eager model."""
+    generator = torch.Generator().manual_seed(seed)
+    return (torch.rand(count, 3, 112, 112, generator=generator) * 2 - 1,
+            torch.rand(count, 1, 112, 112, generator=generator) * 2 - 1)
+
+
+def export_torchscript(model, path):
+    """Trace and freeze the HashEncoder of model into a TorchScript file."""
+    encoder = HashEncoder(model).eval()
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(encoder, parity_inputs(count=2)))
+    frozen.save(path)
+
+
+def export_onnx(model, path, opset_version=17):
+    """Export the HashEncoder of model to ONNX with a dynamic batch dimension."""
+    encoder = HashEncoder(model).eval()
+    with torch.no_grad():
+        torch.onnx.export(encoder, parity_inputs(count=2), path,
+                          input_names=['face', 'fingerprint'], output_names=['bits'],
+                          dynamic_axes={'face': {0: 'batch'}, 'fingerprint': {0: 'batch'},
+                                        'bits': {0: 'batch'}},
+                          opset_version=opset_version, dynamo=False)
+
+
+def save_bundle(model, path):
+    """Write an inference-ready weight bundle for model."""
+    torch.save({
+        'format': BUNDLE_FORMAT,
+        'config': {'num_classes': model.margin_head.weight.shape[0],
+                   'hash_bits': model.hash_layer.out_features,
+                   'fp_hash_bits': model.fp_hash_layer.out_features if model.fp_hash_layer is not None else 0},
+        'state_dict': {k: v.detach().cpu().contiguous() for k, v in model.state_dict().items()},
+    }, path)
+
+
+def load_bundle(path, device='cpu'):
+    """Build MultimodalHashNet from a weight bundle without downloading or initialising weights."""
+    bundle = torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    if bundle.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"{path} is not a {BUNDLE_FORMAT} weight bundle")
+    with torch.device('meta'):
+        model = MultimodalHashNet(pretrained=False, **bundle['config'])
+    model.load_state_dict(bundle['state_dict'], assign=True)
+    return model.to(device).eval()
+
+
+def load_torchscript(path, device='cpu'):
+    module = torch.jit.load(path, map_location=device).eval()
+    return torch.jit.optimize_for_inference(module)
+
+
+def load_model(weights_path=None, device='cpu'):
+    """
+    Load the serving model: from a weight bundle when weights_path is set,
+    otherwise from ImageNet-pretrained backbones (downloads on first use).
+    """
+    if weights_path:
+        return load_bundle(weights_path, device=device)
+    return MultimodalHashNet(num_classes=1000, hash_bits=128).to(device).eval()
+
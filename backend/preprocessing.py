@@ -0,0 +1,149 @@
+"""
+Image preprocessing shared by the API and the model tooling.
+
+Faces become normalized 3x112x112 RGB tensors and fingerprints normalized
+1x112x112 grayscale tensors, matching what MultimodalHashNet was built for.
+
+load_image opens uploads for those transforms. JPEGs are decoded at
+reduced resolution when possible (libjpeg DCT scaling by 1/2, 1/4 or 1/8,
+never below INPUT_SIZE), so a 12 MP phone photo is never materialised at
+full size just to be shrunk to 112x112. EXIF orientation is applied.
+
+The serving path does not run the torchvision transforms per image. Each
+image is resized to a uint8 array (fingerprints converted to grayscale in
+the same step) by face_array / fp_array. BatchPreprocessor then normalizes a whole
+batch at once into a preallocated, optionally pinned, float32 buffer that
+the inference backend reads directly. The arithmetic is the same as
+ToTensor + Normalize, so both paths produce bit-identical inputs. The
+serving path is NumPy only; torch and torchvision are imported by the
+tooling's preprocess_pair and for pinned buffers.
+"""
+
+import functools
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+INPUT_SIZE = (112, 112)
+
+
+@functools.lru_cache(maxsize=None)
+def transforms():
+    """(face_transform, fp_transform): the torchvision transforms the model was trained with."""
+    import torchvision.transforms as T
+    face_transform = T.Compose([
+        T.Resize(INPUT_SIZE),
+        T.ToTensor(),
+        T.Normalize([0.5, 0.5, 0.5], [0.5, 0.5, 0.5])
+    ])
+    fp_transform = T.Compose([
+        T.Grayscale(num_output_channels=1),
+        T.Resize(INPUT_SIZE),
+        T.ToTensor(),
+        T.Normalize([0.5], [0.5])
+    ])
+    return face_transform, fp_transform
+
+
+def load_image(fp, draft=True, admit=None):
+    """
+    Open an encoded image from a path or file object, ready for
+    preprocess_pair. admit, if given, is called with the image while only
+    its header has been read, and with the size it will be decoded at.
+    """
+    img = Image.open(fp)
+    if draft and img.format == 'JPEG':
+        img.draft(None, INPUT_SIZE)
+    if admit is not None:
+        admit(img)
+    ImageOps.exif_transpose(img, in_place=True)
+    return img
+
+
+def preprocess_pair(face_img, fp_img):
+    if face_img.mode != 'RGB':
+        face_img = face_img.convert('RGB')
+    face_transform, fp_transform = transforms()
+    return face_transform(face_img), fp_transform(fp_img)
+
+
+def _resized_array(img, mode):
+    img = img if img.mode == mode else img.convert(mode)
+    return np.asarray(img.resize((INPUT_SIZE[1], INPUT_SIZE[0]), Image.BILINEAR))
+
+
+def face_array(img):
+    """Resized uint8 (H, W, 3) RGB array of a face image."""
+    return _resized_array(img, 'RGB')
+
+
+def fp_array(img):
+    """Resized uint8 (H, W) grayscale array of a fingerprint image."""
+    return _resized_array(img, 'L')
+
+
+def to_arrays(face_img, fp_img):
+    return face_array(face_img), fp_array(fp_img)
+
+
+class BatchPreprocessor:
+    """Normalizes batches of to_arrays output into per-thread preallocated float32 buffers."""
+
+    def __init__(self, capacity=8, pin_memory=False):
+        self.capacity = capacity
+        self.pin_memory = pin_memory
+        self._local = threading.local()
+
+    def _buffers(self, count):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None or len(buffers[0]) < count:
+            capacity = max(count, self.capacity)
+            buffers = tuple(self._allocate((capacity, channels, *INPUT_SIZE)) for channels in (3, 1))
+            self._local.buffers = buffers
+        return buffers
+
+    def _allocate(self, shape):
+        if not self.pin_memory:
+            return np.empty(shape, dtype=np.float32)
+        import torch
+        return torch.empty(shape, dtype=torch.float32, pin_memory=True).numpy()
+
+    def normalize(self, array_pairs):
+        """
+        (face, fp) float32 NCHW batches for a list of to_arrays pairs. They
+        are views of this thread's buffer and stay valid until its next call.
+        """
+        count = len(array_pairs)
+        face_buffer, fp_buffer = self._buffers(count)
+        face, fp = face_buffer[:count], fp_buffer[:count]
+        for i, (face_u8, fp_u8) in enumerate(array_pairs):
+            face[i] = face_u8.transpose(2, 0, 1)
+            fp[i, 0] = fp_u8
+        for batch in (face, fp):
+            _normalize_in_place(batch)
+        return face, fp
+
+    def normalize_faces(self, face_arrays):
+        """float32 N3HW batch for a list of face_array outputs, in this thread's face buffer."""
+        count = len(face_arrays)
+        face = self._buffers(count)[0][:count]
+        for i, face_u8 in enumerate(face_arrays):
+            face[i] = face_u8.transpose(2, 0, 1)
+        return _normalize_in_place(face)
+
+    def normalize_fingerprints(self, fp_arrays):
+        """float32 N1HW batch for a list of fp_array outputs, in this thread's fingerprint buffer."""
+        count = len(fp_arrays)
+        fp = self._buffers(count)[1][:count]
+        for i, fp_u8 in enumerate(fp_arrays):
+            fp[i, 0] = fp_u8
+        return _normalize_in_place(fp)
+
+
+def _normalize_in_place(batch):
+    # Same float32 operations as ToTensor (x / 255) and Normalize((x - 0.5) / 0.5).
+    np.divide(batch, 255, out=batch)
+    np.subtract(batch, 0.5, out=batch)
+    np.divide(batch, 0.5, out=batch)
+    return batch
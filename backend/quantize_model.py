@@ -0,0 +1,177 @@
+"""
+INT8 quantized inference mode for MultimodalHashNet.
+
+Both ResNet backbones are statically quantized (FX graph mode, which also
+fuses Conv-BN-ReLU) after calibrating activation ranges on local images;
+the fusion and hash_layer Linear layers are dynamically quantized. The
+result is saved as a frozen TorchScript artifact served with
+INFERENCE_BACKEND=quantized / MODEL_QUANTIZED_PATH.
+
+Usage:
+    python quantize_model.py calibrate OUT --weights BUNDLE --faces DIR --fingerprints DIR
+    python quantize_model.py evaluate ARTIFACT --weights BUNDLE --faces DIR --fingerprints DIR
+                                      [--report report.json]
+
+Face and fingerprint images are paired in sorted file-name order; each
+tower is calibrated on its own modality, so pairs need not be genuine.
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from model import HashEncoder, load_bundle
+from preprocessing import load_image, preprocess_pair
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def load_image_pairs(face_dir, fp_dir, limit=None):
+    """Preprocessed (face, fp) tensor pairs from two local image folders."""
+    def listing(folder):
+        return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                      if name.lower().endswith(IMAGE_EXTENSIONS))
+    faces, fps = listing(face_dir), listing(fp_dir)
+    if not faces or not fps:
+        raise SystemExit('❌ Both image folders must contain at least one image')
+    count = max(len(faces), len(fps)) if limit is None else limit
+    pairs = []
+    for face_path, fp_path in itertools.islice(zip(itertools.cycle(faces), itertools.cycle(fps)), count):
+        with load_image(face_path) as face_img, load_image(fp_path) as fp_img:
+            pairs.append(preprocess_pair(face_img, fp_img))
+    return pairs
+
+
+def batches(pairs, batch_size):
+    for start in range(0, len(pairs), batch_size):
+        chunk = pairs[start:start + batch_size]
+        yield torch.stack([f for f, _ in chunk]), torch.stack([p for _, p in chunk])
+
+
+def quantize(model, pairs, batch_size=16):
+    """Return a quantized HashEncoder calibrated on the given tensor pairs."""
+    model = copy.deepcopy(model).eval()
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    face, fp = pairs[0]
+    face_model = prepare_fx(model.face_model, qconfig_mapping, (face[None],))
+    fp_model = prepare_fx(model.fp_model, qconfig_mapping, (fp[None],))
+    with torch.no_grad():
+        for face_batch, fp_batch in batches(pairs, batch_size):
+            face_model(face_batch)
+            fp_model(fp_batch)
+    model.face_model = convert_fx(face_model)
+    model.fp_model = convert_fx(fp_model)
+    model.fusion = quantize_dynamic(model.fusion, {torch.nn.Linear}, dtype=torch.qint8)
+    model.hash_layer = quantize_dynamic(torch.nn.Sequential(model.hash_layer), {torch.nn.Linear},
+                                        dtype=torch.qint8)[0]
+    return HashEncoder(model).eval()
+
+
+def save_quantized(encoder, path, example_pair):
+    face, fp = example_pair
+    with torch.no_grad():
+        torch.jit.freeze(torch.jit.trace(encoder, (face[None], fp[None]))).save(path)
+
+
+def load_quantized(path, device='cpu'):
+    return torch.jit.load(path, map_location=device).eval()
+
+
+def latency_ms(encoder, pair, iterations=20, warmup=3):
+    face, fp = pair[0][None], pair[1][None]
+    timings = []
+    with torch.no_grad():
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            encoder(face, fp)
+            if i >= warmup:
+                timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def evaluate(reference, quantized, pairs, batch_size=16):
+    """Latency and Hamming drift of the quantized codes against FP32."""
+    drift = []
+    with torch.no_grad():
+        for face_batch, fp_batch in batches(pairs, batch_size):
+            drift.append((reference(face_batch, fp_batch) != quantized(face_batch, fp_batch)).sum(dim=1))
+    drift = torch.cat(drift).numpy()
+    fp32_ms, int8_ms = latency_ms(reference, pairs[0]), latency_ms(quantized, pairs[0])
+    return {
+        'pairs': int(len(drift)),
+        'fp32_latency_ms': fp32_ms,
+        'int8_latency_ms': int8_ms,
+        'speedup': fp32_ms / int8_ms,
+        'hamming_drift_mean': float(drift.mean()),
+        'hamming_drift_p95': float(np.percentile(drift, 95)),
+        'hamming_drift_max': int(drift.max()),
+        'bit_flip_rate': float(drift.mean() / 128),
+        'identical_codes': float((drift == 0).mean()),
+    }
+
+
+def print_report(report):
+    print(f"   pairs evaluated:      {report['pairs']}")
+    print(f"   latency (batch 1):    FP32 {report['fp32_latency_ms']:.1f} ms, "
+          f"INT8 {report['int8_latency_ms']:.1f} ms ({report['speedup']:.1f}x)")
+    print(f"   Hamming drift:        mean {report['hamming_drift_mean']:.2f}, "
+          f"p95 {report['hamming_drift_p95']:.1f}, max {report['hamming_drift_max']} of 128 bits")
+    print(f"   identical codes:      {report['identical_codes'] * 100:.1f}%")
+
+
+def run_calibrate(args):
+    model = load_bundle(args.weights)
+    pairs = load_image_pairs(args.faces, args.fingerprints, args.limit)
+    encoder = quantize(model, pairs, args.batch_size)
+    save_quantized(encoder, args.output, pairs[0])
+    print(f"✅ Wrote {args.output} (calibrated on {len(pairs)} image pairs)")
+    print_report(evaluate(HashEncoder(model).eval(), load_quantized(args.output), pairs, args.batch_size))
+
+
+def run_evaluate(args):
+    pairs = load_image_pairs(args.faces, args.fingerprints, args.limit)
+    report = evaluate(HashEncoder(load_bundle(args.weights)).eval(), load_quantized(args.artifact),
+                      pairs, args.batch_size)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='INT8 quantization of MultimodalHashNet')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(command):
+        command.add_argument('--weights', required=True, help='FP32 weight bundle')
+        command.add_argument('--faces', required=True, help='folder of face images')
+        command.add_argument('--fingerprints', required=True, help='folder of fingerprint images')
+        command.add_argument('--limit', type=int, help='number of image pairs to use')
+        command.add_argument('--batch-size', type=int, default=16)
+
+    calibrate = commands.add_parser('calibrate', help='calibrate and write a quantized artifact')
+    calibrate.add_argument('output')
+    add_common(calibrate)
+    calibrate.set_defaults(func=run_calibrate)
+
+    evaluate_cmd = commands.add_parser('evaluate', help='latency and Hamming drift report against FP32')
+    evaluate_cmd.add_argument('artifact')
+    add_common(evaluate_cmd)
+    evaluate_cmd.add_argument('--report', help='write the report as JSON to this path')
+    evaluate_cmd.set_defaults(func=run_evaluate)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
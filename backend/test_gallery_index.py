@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from gallery_index import GalleryIndex, MultiIndexHashIndex, unpack_hash
+
+
+def random_gallery(rng, count, hash_bits=128):
+    return np.arange(1, count + 1), rng.integers(0, 2, (count, hash_bits))
+
+
+def flipped(rng, code, flips):
+    probe = code.copy()
+    bits = rng.choice(len(code), size=flips, replace=False)
+    probe[bits] ^= 1
+    return probe
+
+
+@pytest.mark.parametrize('num_tables, radius', [(8, 15), (8, 23), (16, 31)])
+def test_mih_matches_linear_scan_within_radius(num_tables, radius):
+    rng = np.random.default_rng(radius)
+    ids, codes = random_gallery(rng, 2000)
+    linear = GalleryIndex()
+    mih = MultiIndexHashIndex(num_tables=num_tables, radius=radius)
+    linear.build(ids, codes)
+    mih.build(ids, codes)
+
+    for _ in range(300):
+        probe = flipped(rng, codes[rng.integers(len(codes))], int(rng.integers(0, 2 * radius)))
+        _, expected_distance = linear.nearest(probe)
+        found_id, found_distance = mih.nearest(probe)
+        if expected_distance <= radius:
+            assert found_distance == expected_distance
+            assert linear.distances_to(probe, [found_id])[1].tolist() == [expected_distance]
+        else:
+            assert found_distance is None or found_distance > radius
+
+
+def test_mih_append_matches_full_build():
+    rng = np.random.default_rng(0)
+    ids, codes = random_gallery(rng, 500)
+    appended = MultiIndexHashIndex()
+    appended.build(ids[:400], codes[:400])
+    for start in range(400, 500, 25):
+        appended.add(ids[start:start + 25], codes[start:start + 25])
+    built = MultiIndexHashIndex()
+    built.build(ids, codes)
+
+    for ours, theirs in zip(appended._snapshot, built._snapshot):
+        assert ours.dtype == theirs.dtype
+        assert np.array_equal(ours, theirs)
+
+
+def test_mih_add_replaces_existing_ids():
+    rng = np.random.default_rng(1)
+    ids, codes = random_gallery(rng, 100)
+    mih = MultiIndexHashIndex()
+    mih.build(ids, codes)
+    replacement = 1 - codes[:1]
+    mih.add(ids[:1], replacement)
+
+    assert len(mih) == len(ids)
+    assert mih.nearest(replacement[0]) == (int(ids[0]), 0)
+    assert unpack_hash(mih._snapshot[0][mih.user_ids() == ids[0]])[0].tolist() == replacement[0].tolist()
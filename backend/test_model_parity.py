@@ -0,0 +1,69 @@
+import copy
+
+import numpy as np
+import pytest
+import torch
+
+from inference_backends import OnnxBackend, TorchBackend
+from model import (FingerprintEncoder, HashEncoder, MultimodalHashNet, export_onnx, export_torchscript,
+                   load_torchscript, parity_inputs, prepare_for_inference)
+
+
+@pytest.fixture(scope='module')
+def model():
+    torch.manual_seed(0)
+    model = MultimodalHashNet(pretrained=False, fp_hash_bits=64).eval()
+    # Fresh BatchNorms are identities; give them running statistics so that
+    # folding them actually changes the weights.
+    generator = torch.Generator().manual_seed(1)
+    for module in model.modules():
+        if isinstance(module, (torch.nn.BatchNorm1d, torch.nn.BatchNorm2d)):
+            module.running_mean.uniform_(-0.1, 0.1, generator=generator)
+            module.running_var.uniform_(0.5, 1.5, generator=generator)
+    return model
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    return tuple(t.numpy() for t in parity_inputs(count=8))
+
+
+@pytest.fixture(scope='module')
+def eager(model):
+    return TorchBackend(HashEncoder(model).eval(), 'eager', fp_encoder=FingerprintEncoder(model).eval())
+
+
+@pytest.fixture(scope='module')
+def reference(eager, inputs):
+    return eager.hash_batch(*inputs)
+
+
+def test_folded_matches_eager(model, inputs, reference):
+    folded_model = copy.deepcopy(model)
+    folded = TorchBackend(prepare_for_inference(folded_model), 'eager-folded',
+                          fp_encoder=FingerprintEncoder(folded_model).eval())
+    assert np.array_equal(folded.hash_batch(*inputs), reference)
+
+
+def test_split_towers_match_eager(eager, inputs, reference):
+    face, fp = inputs
+    assert np.array_equal(eager.hash_from_face_features(eager.face_feature_batch(face), fp), reference)
+
+    codes, features = eager.fp_code_batch(fp)
+    assert np.array_equal(eager.hash_from_fp_features(face, features), reference)
+    with torch.no_grad():
+        assert np.array_equal(codes, eager.fp_encoder(torch.from_numpy(fp)).numpy())
+
+
+def test_torchscript_matches_eager(model, inputs, reference, tmp_path):
+    path = str(tmp_path / 'model.ts')
+    export_torchscript(model, path)
+    assert np.array_equal(TorchBackend(load_torchscript(path), 'torchscript').hash_batch(*inputs), reference)
+
+
+def test_onnx_matches_eager(model, inputs, reference, tmp_path):
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('onnx')
+    path = str(tmp_path / 'model.onnx')
+    export_onnx(model, path)
+    assert np.array_equal(OnnxBackend(path).hash_batch(*inputs), reference)
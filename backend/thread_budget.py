@@ -0,0 +1,93 @@
+"""
+CPU thread budget for model-serving processes.
+
+By default PyTorch starts one intra-op thread per visible core in every
+process, so N gunicorn workers on a C-core box run N*C compute threads and
+p99 latency collapses under load. The budget divides the CPUs actually
+available to the container (affinity mask and cgroup quota) by the number
+of forward passes that can run at once on the node:
+workers x concurrent inference calls per worker.
+
+apply() must run before the model is built. torch.set_num_threads covers
+the OpenMP and MKL pools torch has already loaded. The OMP/MKL/OpenBLAS
+environment variables cover native libraries loaded later, and child
+processes.
+"""
+
+import math
+import os
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def cgroup_cpu_limit():
+    """CPU quota of this container in cores (cgroup v2, then v1), or None when unlimited."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        return int(quota) / int(period) if quota != 'max' else None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus():
+    """Cores this process may use: the affinity mask, capped by the cgroup quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        # Rounded down: a thread per fractional core only gets throttled.
+        cpus = min(cpus, max(1, math.floor(limit)))
+    return cpus
+
+
+def compute_budget(workers=1, concurrency=1, intra_op_threads=0, inter_op_threads=0):
+    """
+    Threads per forward pass for `workers` processes each running up to
+    `concurrency` forward passes at once. Explicit (non-zero) thread counts
+    win over the computed ones.
+    """
+    cpus = available_cpus()
+    workers, concurrency = max(1, workers), max(1, concurrency)
+    return {
+        'cpus': cpus,
+        'cgroup_cpu_limit': cgroup_cpu_limit(),
+        'workers': workers,
+        'concurrency_per_worker': concurrency,
+        'intra_op_threads': intra_op_threads or max(1, cpus // (workers * concurrency)),
+        # The network is a straight chain of ops, so inter-op parallelism
+        # only adds threads that compete with the intra-op pool.
+        'inter_op_threads': inter_op_threads or 1,
+        'source': 'configured' if intra_op_threads else 'auto',
+    }
+
+
+def apply(budget, torch_threads=True):
+    """
+    Apply a budget to this process before the model is built; returns it
+    with the torch values. torch_threads=False only sets the environment,
+    for processes that do not run the model with torch.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(budget['intra_op_threads'])
+    if not torch_threads:
+        return budget
+    import torch
+    torch.set_num_threads(budget['intra_op_threads'])
+    try:
+        torch.set_num_interop_threads(budget['inter_op_threads'])
+    except RuntimeError:
+        pass  # fixed for the process once any inter-op work has run
+    budget['torch_intra_op_threads'] = torch.get_num_threads()
+    budget['torch_inter_op_threads'] = torch.get_num_interop_threads()
+    return budget
@@ -0,0 +1,83 @@
+"""
+Startup warm-up and readiness tracking for model-serving workers.
+
+A worker is live as soon as it can answer HTTP, but only ready once the
+warm-up steps (synthetic forward passes at every served batch size, gallery
+load) have run, so allocator setup, oneDNN primitive creation and weight
+page faults are paid before the load balancer routes real traffic to it.
+A failed warm-up is retried after retry_interval_s, so a dependency that
+comes up late (such as a remote inference server) delays readiness instead
+of keeping the worker out of rotation until it is restarted.
+"""
+
+import os
+import threading
+import time
+import traceback
+
+
+class Warmup:
+    def __init__(self, steps, retry_interval_s=5.0):
+        """
+        steps is a list of (name, callable) run in order on start(). All steps
+        are run again after retry_interval_s when one raises; a
+        retry_interval_s of None gives up after the first failure.
+        """
+        self.steps = steps
+        self.retry_interval_s = retry_interval_s
+        self.ready = False
+        self.state = 'pending'
+        self.error = None
+        self.durations_ms = {}
+        self.attempts = 0
+        self.started_at = None
+        self.finished_at = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self, background=True):
+        """Run the steps once per process, in a daemon thread unless background is False."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.ready, self.state, self.error, self.durations_ms, self.attempts = False, 'running', None, {}, 0
+        if background:
+            threading.Thread(target=self._run, name='warmup', daemon=True).start()
+        else:
+            self._run()
+
+    def status(self):
+        return {
+            'state': self.state,
+            'ready': self.ready,
+            'error': self.error,
+            'attempts': self.attempts,
+            'duration_ms': ((self.finished_at or time.time()) - self.started_at) * 1000
+            if self.started_at else None,
+            'steps_ms': dict(self.durations_ms),
+        }
+
+    def _run(self):
+        self.started_at, self.finished_at = time.time(), None
+        while True:
+            self.attempts += 1
+            try:
+                for name, step in self.steps:
+                    started = time.perf_counter()
+                    step()
+                    self.durations_ms[name] = (time.perf_counter() - started) * 1000
+            except Exception as e:
+                self.error = f'{type(e).__name__}: {e}'
+                traceback.print_exc()
+                if self.retry_interval_s is None:
+                    self.state = 'failed'
+                    self.finished_at = time.time()
+                    return
+                self.state = 'retrying'
+                time.sleep(self.retry_interval_s)
+            else:
+                self.state, self.error = 'complete', None
+                self.ready = True
+                self.finished_at = time.time()
+                return